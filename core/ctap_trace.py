@@ -0,0 +1,193 @@
+# core/ctap_trace.py
+# Enregistrement et rejeu du trafic CTAP échangé avec le token.
+#
+# RecordingDevice enveloppe un vrai device fido2 et écrit chaque échange
+# (commande, requête, réponse, durée, erreur) dans un fichier JSON lines,
+# les seeds d'OTP_CREATE et les codes renvoyés par OTP_GENERATE étant masqués. ReplayDevice relit ce fichier et
+# rejoue les réponses avec le timing d'origine ou accéléré, sans token.
+#
+# Activation : NEOOTP_RECORD=trace.jsonl ou NEOOTP_REPLAY=trace.jsonl
+# (NEOOTP_REPLAY_SPEED=2 pour rejouer deux fois plus vite, 0 sans attente).
+# Résumé d'une trace : python -m core.ctap_trace trace.jsonl
+
+import json
+import os
+import sys
+import threading
+import time
+
+from fido2 import cbor
+from fido2.ctap import CtapDevice
+from fido2.hid import CAPABILITY, CTAPHID
+
+TRACE_VERSION = 1
+OTP_CREATE = 0xB1  # cf. core.fido_backend
+OTP_GENERATE = 0xB2
+COMMAND_NAMES = {0x04: "getInfo", 0xB1: "OTP_CREATE", 0xB2: "OTP_GENERATE",
+                 0xB3: "OTP_DELETE", 0xB4: "OTP_ENUMERATE"}
+
+
+def redact_request(cmd: int, data: bytes) -> bytes:
+    """Remplace la seed d'un OTP_CREATE par des zéros de même longueur"""
+    if cmd != CTAPHID.CBOR or not data or data[0] != OTP_CREATE:
+        return data
+    try:
+        payload = cbor.decode(data[1:])
+        key = payload.get(3)
+        if isinstance(key, dict) and -1 in key:
+            key[-1] = bytes(len(key[-1]))
+        return data[:1] + cbor.encode(payload)
+    except Exception:
+        return data[:1]  # illisible : on ne garde que l'octet de commande
+
+
+def redact_response(cmd: int, data: bytes, response: bytes) -> bytes:
+    """Remplace le code d'une réponse OTP_GENERATE par des zéros de même longueur :
+    un code HOTP reste valable tant qu'il n'est pas utilisé. Les tailles sont conservées pour le rejeu"""
+    if cmd != CTAPHID.CBOR or not data or data[0] != OTP_GENERATE or not response or response[0]:
+        return response
+    try:
+        payload = cbor.decode(response[1:])
+        code = payload.get(1)
+        if isinstance(code, str):
+            payload[1] = "0" * len(code)
+        return response[:1] + cbor.encode(payload)
+    except Exception:
+        return response[:1]  # illisible : on ne garde que le statut
+
+
+class TraceRecorder:
+    """Fichier de trace partagé par tous les devices enveloppés d'une session"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record: dict):
+        with self._lock:
+            record["t"] = round(time.monotonic() - self._start, 6)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def wrap(self, device):
+        return RecordingDevice(device, self)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingDevice(CtapDevice):
+    def __init__(self, device, recorder: TraceRecorder):
+        self._device = device
+        self._recorder = recorder
+        recorder.write({"open": repr(device), "capabilities": int(device.capabilities),
+                        "version": TRACE_VERSION})
+
+    @property
+    def capabilities(self) -> int:
+        return self._device.capabilities
+
+    def call(self, cmd, data=b"", event=None, on_keepalive=None):
+        record = {"cmd": cmd, "req": redact_request(cmd, data).hex()}
+        start = time.perf_counter()
+        try:
+            response = self._device.call(cmd, data, event, on_keepalive)
+        except Exception as e:
+            record["dt"] = round(time.perf_counter() - start, 6)
+            record["error"] = type(e).__name__
+            record["msg"] = str(e)
+            self._recorder.write(record)
+            raise
+        record["dt"] = round(time.perf_counter() - start, 6)
+        record["resp"] = redact_response(cmd, data, response).hex()
+        self._recorder.write(record)
+        return response
+
+    def close(self):
+        self._recorder.write({"close": True})
+        self._device.close()
+
+    @classmethod
+    def list_devices(cls):
+        return iter(())  # n'enveloppe que des devices déjà découverts
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayDevice(CtapDevice):
+    """Rejoue une trace : chaque appel consomme le prochain échange de même commande"""
+
+    def __init__(self, path, speed=1.0):
+        records = load_trace(path)
+        header = next((r for r in records if "open" in r), {})
+        self._capabilities = header.get("capabilities", int(CAPABILITY.CBOR))
+        self._exchanges = [r for r in records if "cmd" in r]
+        self._position = 0
+        self.speed = speed
+
+    @property
+    def capabilities(self) -> int:
+        return self._capabilities
+
+    def call(self, cmd, data=b"", event=None, on_keepalive=None):
+        ctap_cmd = data[0] if data else None
+        for index in range(self._position, len(self._exchanges)):
+            record = self._exchanges[index]
+            req = bytes.fromhex(record["req"])
+            if record["cmd"] == cmd and (req[:1] == data[:1]):
+                break
+        else:
+            raise OSError(f"Trace exhausted (no exchange for command 0x{ctap_cmd or cmd:02X})")
+        self._position = index + 1
+
+        if self.speed:
+            time.sleep(record.get("dt", 0) / self.speed)
+        if "error" in record:
+            raise OSError(f"{record['error']}: {record.get('msg', '')}")
+        return bytes.fromhex(record["resp"])
+
+    @classmethod
+    def list_devices(cls):
+        return iter(())
+
+
+def trace_options_from_env() -> dict:
+    """Arguments FidoOTPBackend correspondant à NEOOTP_RECORD / NEOOTP_REPLAY"""
+    replay_path = os.environ.get("NEOOTP_REPLAY")
+    if replay_path:
+        speed = float(os.environ.get("NEOOTP_REPLAY_SPEED", "1"))
+        # Une seule instance : une reconnexion reprend la trace là où elle en était
+        replay = ReplayDevice(replay_path, speed)
+        return {"device_sources": [lambda: [replay]]}
+    record_path = os.environ.get("NEOOTP_RECORD")
+    if record_path:
+        return {"device_wrapper": TraceRecorder(record_path).wrap}
+    return {}
+
+
+def summarize(path) -> str:
+    """Nombre d'échanges, temps total et moyen par commande"""
+    stats = {}
+    for record in load_trace(path):
+        if "cmd" not in record:
+            continue
+        req = bytes.fromhex(record["req"])
+        name = COMMAND_NAMES.get(req[0], f"0x{req[0]:02X}") if req else f"CTAPHID 0x{record['cmd']:02X}"
+        if "error" in record:
+            name += " (error)"
+        count, total = stats.get(name, (0, 0.0))
+        stats[name] = (count + 1, total + record.get("dt", 0.0))
+    lines = [f"{'command':<24}{'count':>8}{'total ms':>12}{'avg ms':>10}"]
+    for name, (count, total) in sorted(stats.items()):
+        lines.append(f"{name:<24}{count:>8}{total * 1000:>12.1f}{total * 1000 / count:>10.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(summarize(sys.argv[1]))
@@ -3,13 +3,19 @@ from PyQt6.QtCore import QObject, pyqtSignal, QTimer, Qt, pyqtSlot
 
 class DetectorWorker(QObject):
     device_status = pyqtSignal(bool)
+    card_connected = pyqtSignal()  # carte NFC posée et déjà connectée
     
-    def __init__(self, backend, interval=5000):
+    def __init__(self, backend, interval=5000, pcsc_monitor=None):
         super().__init__()
         self.backend = backend
         self.interval = interval
         self.timer = None
         self.last_status = None
+        # Évènements de lecteur PC/SC, traités dans le thread du détecteur
+        self.pcsc_monitor = pcsc_monitor
+        if pcsc_monitor is not None:
+            pcsc_monitor.card_inserted.connect(self.on_card_inserted)
+            pcsc_monitor.card_removed.connect(self.on_card_removed)
 
     @pyqtSlot()
     def start(self):
@@ -42,3 +48,18 @@ class DetectorWorker(QObject):
         if connected != self.last_status:
             self.device_status.emit(connected)
             self.last_status = connected
+
+    @pyqtSlot(str)
+    def on_card_inserted(self, reader):
+        # Connexion directe au lecteur concerné, sans attendre le prochain ping ni tout rescanner
+        monitor = self.pcsc_monitor
+        self.backend.reset_backoff()  # évènement de branchement : referme le disjoncteur
+        if self.backend.connect_from(lambda: monitor.devices(reader), reader=reader):
+            self.last_status = True
+            self.card_connected.emit()
+
+    @pyqtSlot(str)
+    def on_card_removed(self, reader):
+        # Seule une connexion ouverte sur ce lecteur est concernée, pas un token USB
+        self.backend.invalidate_connection(reader)
+        self._poll_device()
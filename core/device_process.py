@@ -0,0 +1,246 @@
+# core/device_process.py
+# Mode optionnel : tout le trafic CTAP tourne dans un processus enfant.
+# Un blocage USB/HID dans fido2 ne peut plus geler le processus GUI : chaque
+# appel a un délai maximal, au-delà duquel le watchdog tue le worker, le
+# relance et rejoue l'établissement de la connexion.
+#
+# Préemption plus grossière qu'en mode direct : le tube vers le worker ne porte
+# qu'un appel à la fois. Une action utilisateur passe devant les appels de fond en
+# attente, mais attend la fin de l'appel en cours (une énumération complète, par
+# exemple). Les lots de codes de fond sont donc découpés en appels de
+# BACKGROUND_CODES_PER_CALL labels, entre lesquels un clic HOTP ou une copie s'intercale.
+
+import multiprocessing
+import threading
+import time
+
+from core.fido_backend import DeviceLock, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+CALL_TIMEOUT = 15.0     # secondes max par appel avant de considérer le worker bloqué
+START_TIMEOUT = 20.0    # démarrage du worker + première connexion
+BACKGROUND_CODES_PER_CALL = 8
+
+# Méthodes du backend qui prennent une priorité : elle est aussi transmise au worker
+# (disjoncteur de reconnexion, cession du verrou aux actions utilisateur)
+PRIORITY_METHODS = {"ping_device", "list_generators", "get_all_generators", "generate_code", "generate_codes"}
+
+
+def _worker_main(conn):
+    """Boucle du processus enfant : exécute les appels sur un vrai FidoOTPBackend"""
+    from core.i18n_manager import setup_i18n
+    setup_i18n()
+    from core.fido_backend import FidoOTPBackend
+
+    backend = FidoOTPBackend()
+    # Rejoue l'établissement de la connexion dès le (re)démarrage
+    try:
+        with backend.lock:
+            backend._connect()
+    except Exception:
+        pass
+    conn.send(("ready", None, backend.last_error))
+
+    while True:
+        try:
+            call_id, method, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            return
+        if method == "shutdown":
+            with backend.lock:
+                backend._cleanup_connection()
+            return
+        try:
+            result = getattr(backend, method)(*args, **kwargs)
+        except Exception as e:
+            backend.last_error = str(e)
+            result = None
+        conn.send((call_id, result, backend.last_error))
+
+
+class DeviceProcessBackend:
+    """Même interface publique que FidoOTPBackend, exécutée dans un processus supervisé"""
+
+    def __init__(self, call_timeout=CALL_TIMEOUT):
+        self.lock = DeviceLock()  # un seul appel à la fois vers le worker, avec priorités
+        self.call_timeout = call_timeout
+        self.last_error = None
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._call_id = 0
+        self._closed = False
+        # Copie locale des codes TOTP reçus : (label, T) -> (code, expiration) ;
+        # cached_code y répond sans aller-retour vers le worker (appelé depuis le thread GUI)
+        self._code_cache = {}
+        self._code_cache_lock = threading.Lock()
+
+    # --- supervision ---
+    def _start_worker(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not self._conn.poll(START_TIMEOUT):
+            self._kill_worker()
+            raise TimeoutError(_("Device worker did not start"))
+        _tag, _result, self.last_error = self._conn.recv()
+
+    def _kill_worker(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                self._process.kill()
+            self._process.join(1.0)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _restart_worker(self):
+        """Watchdog : remplace un worker bloqué ou mort"""
+        self._kill_worker()
+        self.restarts += 1
+        try:
+            self._start_worker()
+        except Exception as e:
+            self.last_error = str(e)
+
+    def _call(self, method, *args, priority=PRIORITY_INTERACTIVE, timeout=None, **kwargs):
+        with self.lock.hold(priority):
+            if self._closed:
+                return None
+            try:
+                if self._process is None or not self._process.is_alive():
+                    self._kill_worker()
+                    self._start_worker()
+                if method in PRIORITY_METHODS:
+                    kwargs["priority"] = priority
+                self._call_id += 1
+                call_id = self._call_id
+                self._conn.send((call_id, method, args, kwargs))
+                if not self._conn.poll(timeout or self.call_timeout):
+                    self._restart_worker()
+                    self.last_error = _("Device not responding, connection reset")
+                    return None
+                reply_id, result, self.last_error = self._conn.recv()
+                if reply_id != call_id:
+                    # Désynchronisation du protocole : repartir d'un worker propre
+                    self._restart_worker()
+                    return None
+                return result
+            except (EOFError, OSError, TimeoutError):
+                self._restart_worker()
+                self.last_error = _("Device communication error")
+                return None
+
+    def close(self):
+        with self.lock:
+            self._closed = True
+            if self._conn is not None:
+                try:
+                    self._conn.send((0, "shutdown", (), {}))
+                    self._process.join(2.0)
+                except (OSError, ValueError):
+                    pass
+            self._kill_worker()
+
+    # --- API FidoOTPBackend ---
+    def start_prefetch(self):
+        """Démarre le worker et son énumération sans attendre : le premier refresh patiente sur le verrou"""
+        thread = threading.Thread(target=self._call, args=("prefetch",),
+                                  kwargs={"priority": PRIORITY_BACKGROUND}, name="device-prefetch", daemon=True)
+        thread.start()
+        return thread
+
+    def ping_device(self, priority=PRIORITY_BACKGROUND) -> bool:
+        alive = bool(self._call("ping_device", priority=priority))
+        if not alive:
+            self._forget_codes()  # le prochain device n'est peut-être pas le même token
+        return alive
+
+    def list_generators(self, index=0, count=None, priority=PRIORITY_INTERACTIVE):
+        return self._call("list_generators", index, count, priority=priority)
+
+    def get_all_generators(self, priority=PRIORITY_INTERACTIVE, cancelled=None):
+        # L'annulation ne traverse pas la frontière de processus : vérifiée avant l'appel
+        if cancelled and cancelled():
+            return None
+        generators = self._call("get_all_generators", priority=priority)
+        if generators is None:
+            self._forget_codes()
+        return generators
+
+    def _remember_code(self, label, code, at_time, period):
+        if not code:
+            return
+        period = period or 30
+        T = int(at_time) // period
+        now = time.time()
+        with self._code_cache_lock:
+            for key in [k for k, (_code, expires) in self._code_cache.items() if expires <= now]:
+                del self._code_cache[key]
+            self._code_cache[(label, T)] = (code, (T + 1) * period)
+
+    def generate_code(self, label: str, otp_type: int, period: int = None, priority=PRIORITY_INTERACTIVE):
+        at_time = time.time()
+        code = self._call("generate_code", label, otp_type, period, priority=priority)
+        if otp_type == 2 and int(time.time()) // (period or 30) == int(at_time) // (period or 30):
+            self._remember_code(label, code, at_time, period)  # fenêtre sûre : pas de frontière pendant l'appel
+        return code
+
+    def generate_codes(self, labels, at_time=None, periods=None, priority=PRIORITY_BACKGROUND, cancelled=None,
+                       on_result=None):
+        # Un aller-retour avec le worker par tranche : on_result est appelé à la fin de chaque tranche.
+        # En fond, des tranches courtes laissent passer les actions utilisateur entre deux appels
+        at_time = time.time() if at_time is None else at_time
+        labels = list(labels)
+        step = BACKGROUND_CODES_PER_CALL if priority != PRIORITY_INTERACTIVE else max(len(labels), 1)
+        results = {}
+        for start in range(0, len(labels), step):
+            if cancelled and cancelled():
+                break
+            chunk = self._call("generate_codes", labels[start:start + step], at_time, periods,
+                               priority=priority)
+            if chunk is None:
+                break  # worker relancé ou device perdu : les tranches suivantes échoueraient aussi
+            for label, code in chunk.items():
+                self._remember_code(label, code, at_time, (periods or {}).get(label))
+                if on_result and code is not None:
+                    on_result(label, code)
+            results.update(chunk)
+        for label in labels:
+            results.setdefault(label, None)
+        return results
+
+    def cached_code(self, label: str, period: int = None):
+        """Code TOTP de la fenêtre courante déjà reçu du worker ; jamais d'aller-retour"""
+        period = period or 30
+        now = time.time()
+        with self._code_cache_lock:
+            entry = self._code_cache.get((label, int(now) // period))
+        if entry and now < entry[1]:
+            return entry[0]
+        return None
+
+    def _forget_codes(self, label=None):
+        with self._code_cache_lock:
+            if label is None:
+                self._code_cache.clear()
+            else:
+                for key in [k for k in self._code_cache if k[0] == label]:
+                    del self._code_cache[key]
+
+    def clear_code_cache(self, label: str = None):
+        self._forget_codes(label)
+        return self._call("clear_code_cache", label)
+
+    def delete_generator(self, label: str) -> bool:
+        self._forget_codes(label)
+        return bool(self._call("delete_generator", label))
+
+    def create_generator(self, label: str, otp_type: str, secret_b32: str, algo: str,
+                         digits: int = 6, counter: int = None, period: int = None, verify: bool = False) -> bool:
+        self._forget_codes(label)
+        return bool(self._call("create_generator", label, otp_type, secret_b32, algo,
+                               digits=digits, counter=counter, period=period, verify=verify))
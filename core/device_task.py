@@ -0,0 +1,43 @@
+# core/device_task.py
+# Exécute un appel backend sur le pool de threads Qt pour ne jamais bloquer le thread GUI.
+# Le résultat revient par signal ; le callback doit être une méthode d'un QObject
+# pour être exécuté dans le thread de ce QObject (connexion "queued").
+# Une exception de fn n'est jamais convertie en résultat : elle part sur le signal
+# failed(contexte, message), à traiter par l'appelant (on_failed).
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _DeviceTaskSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object, str)  # (contexte, message d'erreur)
+
+
+class DeviceTask(QRunnable):
+    def __init__(self, fn, *args, context=None, **kwargs):
+        super().__init__()
+        self.signals = _DeviceTaskSignals()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.context = context
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(self.context, str(e) or type(e).__name__)
+            return
+        self.signals.finished.emit(result)
+
+
+def run_device_task(fn, *args, on_finished=None, on_failed=None, context=None, **kwargs):
+    """Lance fn(*args, **kwargs) hors du thread GUI ; on_finished(résultat) à la fin,
+    on_failed(context, message) si fn lève une exception"""
+    task = DeviceTask(fn, *args, context=context, **kwargs)
+    if on_finished is not None:
+        task.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        task.signals.failed.connect(on_failed)
+    QThreadPool.globalInstance().start(task)
+    return task
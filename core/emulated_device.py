@@ -0,0 +1,212 @@
+# core/emulated_device.py
+# Token OTP émulé en mémoire : implémente l'interface CtapDevice de fido2 et
+# l'applet OTP (OTP_CREATE / OTP_GENERATE / OTP_DELETE / OTP_ENUMERATE).
+# Sert aux outils de test (soak, benchmarks) sans token physique :
+#     token = EmulatedOTPToken()
+#     backend = FidoOTPBackend(device_sources=[token.list_devices])
+# EmulatedReader joue le rôle d'un lecteur NFC pour core.pcsc_monitor.PcscMonitor.
+
+import hashlib
+import hmac
+import struct
+import threading
+
+from fido2 import cbor
+from fido2.ctap import CtapDevice
+from fido2.hid import CAPABILITY, CTAPHID
+
+OTP_CREATE = 0xB1
+OTP_GENERATE = 0xB2
+OTP_DELETE = 0xB3
+OTP_ENUMERATE = 0xB4
+CTAP2_GET_INFO = 0x04
+
+ERR_INVALID_LENGTH = 0x03
+ERR_INVALID_COMMAND = 0xF2
+ERR_INVALID_PARAMETER = 0xF3
+ERR_GENERATOR_EXISTS = 0xF4
+ERR_GENERATOR_NOT_FOUND = 0xF5
+ERR_MEMORY_FULL = 0xF6
+
+HASHES = {4: hashlib.sha1, 5: hashlib.sha256, 7: hashlib.sha512}
+ENUMERATE_PAGE = 23
+
+
+def hotp_value(secret: bytes, counter: int, digits: int, alg: int = 4) -> str:
+    """RFC 4226 : HMAC puis troncature dynamique"""
+    digest = hmac.new(secret, struct.pack(">Q", counter), HASHES[alg]).digest()
+    offset = digest[-1] & 0x0F
+    binary = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(binary % (10 ** digits)).zfill(digits)
+
+
+class EmulatedOTPToken:
+    """État du token : générateurs, présence USB, compteur de commandes"""
+
+    def __init__(self, capacity=200, max_msg_size=1200, latency=0.0):
+        self.capacity = capacity
+        self.max_msg_size = max_msg_size
+        self.latency = latency  # secondes simulées par commande
+        self.generators = {}    # label -> dict
+        self.plugged = True
+        self.command_count = 0
+        self.lock = threading.Lock()
+
+    def plug(self):
+        self.plugged = True
+
+    def unplug(self):
+        self.plugged = False
+
+    def list_devices(self):
+        """Source de devices pour FidoOTPBackend(device_sources=[...])"""
+        return [EmulatedCtapDevice(self)] if self.plugged else []
+
+    # --- applet OTP ---
+    def handle(self, command: int, payload: dict):
+        """Renvoie (status, réponse)"""
+        if command == CTAP2_GET_INFO:
+            return 0, {1: ["FIDO_2_0"], 3: bytes(16), 5: self.max_msg_size}
+        handler = {
+            OTP_CREATE: self._create,
+            OTP_GENERATE: self._generate,
+            OTP_DELETE: self._delete,
+            OTP_ENUMERATE: self._enumerate,
+        }.get(command)
+        if handler is None:
+            return ERR_INVALID_COMMAND, None
+        return handler(payload or {})
+
+    def _create(self, p):
+        label = p.get(1)
+        if not label or p.get(2) not in (1, 2) or not isinstance(p.get(3), dict):
+            return ERR_INVALID_PARAMETER, None
+        if label in self.generators:
+            return ERR_GENERATOR_EXISTS, None
+        if len(self.generators) >= self.capacity:
+            return ERR_MEMORY_FULL, None
+        key = p[3]
+        self.generators[label] = {
+            "type": p[2],
+            "alg": key.get(3, 4),
+            "secret": key.get(-1, b""),
+            "digits": p.get(4, 6),
+            "counter": int.from_bytes(p.get(5, bytes(8)), "big"),
+            "period": p.get(6, 30),
+        }
+        return 0, None
+
+    def _generate(self, p):
+        g = self.generators.get(p.get(1))
+        if g is None:
+            return ERR_GENERATOR_NOT_FOUND, None
+        if g["type"] == 2:
+            if 2 not in p:
+                return ERR_INVALID_PARAMETER, None
+            moving_factor = int.from_bytes(p[2], "big")
+        else:
+            moving_factor = g["counter"]
+            g["counter"] += 1
+        return 0, {1: hotp_value(g["secret"], moving_factor, g["digits"], g["alg"])}
+
+    def _delete(self, p):
+        if self.generators.pop(p.get(1), None) is None:
+            return ERR_GENERATOR_NOT_FOUND, None
+        return 0, None
+
+    def _entry(self, label, g):
+        entry = {1: label, 2: g["type"], 3: g["alg"], 4: g["digits"]}
+        if g["type"] == 1:
+            entry[5] = g["counter"].to_bytes(8, "big")
+        else:
+            entry[6] = g["period"]
+        return entry
+
+    def _enumerate(self, p):
+        labels = list(self.generators)
+        index = p.get(1, 0)
+        count = p.get(2, ENUMERATE_PAGE)
+        if count == 0:
+            return 0, {1: len(labels)}
+        page = labels[index:index + count]
+        response = {1: len(labels), 2: [self._entry(label, self.generators[label]) for label in page]}
+        if 1 + len(cbor.encode(response)) > self.max_msg_size:
+            return ERR_INVALID_LENGTH, None  # la réponse ne tient pas dans un message
+        return 0, response
+
+
+class EmulatedCtapDevice(CtapDevice):
+    """Transport CTAPHID factice relié à un EmulatedOTPToken"""
+
+    def __init__(self, token: EmulatedOTPToken):
+        self.token = token
+
+    @property
+    def capabilities(self) -> int:
+        return CAPABILITY.CBOR
+
+    def call(self, cmd, data=b"", event=None, on_keepalive=None):
+        if not self.token.plugged:
+            raise OSError("Emulated device unplugged")
+        if cmd == CTAPHID.PING:
+            with self.token.lock:
+                self.token.command_count += 1
+            return data
+        if cmd != CTAPHID.CBOR or not data:
+            raise OSError(f"Unsupported CTAPHID command 0x{cmd:02X}")
+        if self.token.latency:
+            threading.Event().wait(self.token.latency)
+        with self.token.lock:
+            self.token.command_count += 1
+            payload = cbor.decode(data[1:]) if len(data) > 1 else {}
+            status, response = self.token.handle(data[0], payload)
+        if status or response is None:
+            return bytes([status])
+        return b"\x00" + cbor.encode(response)
+
+    def ping(self, msg=b"Hello FIDO"):
+        return self.call(CTAPHID.PING, msg)
+
+    @classmethod
+    def list_devices(cls):
+        return iter(())
+
+
+class EmulatedReader:
+    """Lecteur PC/SC factice : insert()/remove() posent et retirent le token"""
+
+    def __init__(self, token: EmulatedOTPToken, name="Emulated NFC Reader 0"):
+        self.token = token
+        self.name = name
+        self._reported = False  # comme un vrai lecteur : une carte déjà posée est signalée
+        self._cancelled = False
+        self._cond = threading.Condition()
+
+    def insert(self):
+        with self._cond:
+            self.token.plug()
+            self._cond.notify_all()
+
+    def remove(self):
+        with self._cond:
+            self.token.unplug()
+            self._cond.notify_all()
+
+    def wait_for_change(self, timeout_ms=60000):
+        with self._cond:
+            self._cond.wait_for(lambda: self._cancelled or self.token.plugged != self._reported,
+                                timeout_ms / 1000)
+            if self._cancelled:
+                return None
+            if self.token.plugged == self._reported:
+                return []
+            self._reported = self.token.plugged
+            return [(self.name, self._reported)]
+
+    def devices(self, reader):
+        return self.token.list_devices() if reader == self.name else []
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
@@ -1,12 +1,15 @@
 # core/fido_backend.py
 
+import os
+import queue
+import sys
 import threading
-from fido2.ctap2 import Ctap2
-from fido2.hid import CtapHidDevice, CAPABILITY
+from contextlib import contextmanager
 from fido2.ctap import CtapError
 import time
 from base64 import b32decode
-from fido2.pcsc import CtapPcscDevice
+# fido2.ctap2 (et cryptography), fido2.hid et fido2.pcsc (pyscard) sont importés à la
+# première découverte : hors du chemin de démarrage, dans le thread de start_prefetch
 
 OTP_CREATE = 0xB1
 OTP_GENERATE = 0xB2
@@ -16,137 +19,546 @@ OTP_ENUMERATE = 0xB4
 ALG_NAME_TO_CODE = {"SHA1": 4, "SHA256": 5, "SHA512": 7}
 TYPE_NAME_TO_CODE = {"HOTP": 1, "TOTP": 2}
 
-OTP_ERROR_CODES = {
-    0x00: ("OTP_OK", _("Command executed successfully")),
-    0x01: ("ERR_INVALID_CMD", _("Command not recognized")),
-    0xF1: ("OTP_ERR_INVALID_CBOR", _("The command contains invalid CBOR encoding")),
-    0xF2: ("OTP_ERR_INVALID_COMMAND", _("Unrecognized OTP command")),
-    0xF3: ("OTP_ERR_INVALID_PARAMETER", _("Invalid parameter in command")),
-    0xF4: ("OTP_ERR_GENERATOR_EXISTS", _("A generator with this name already exists")),
-    0xF5: ("OTP_ERR_GENERATOR_NOT_FOUND", _("Generator not found")),
-    0xF6: ("OTP_ERR_MEMORY_FULL", _("Memory full, unable to create another generator")),
+
+def otp_error_codes() -> dict:
+    """Table des erreurs OTP, traduite à l'appel et non à l'import"""
+    return {
+        0x00: ("OTP_OK", _("Command executed successfully")),
+        0x01: ("ERR_INVALID_CMD", _("Command not recognized")),
+        0xF1: ("OTP_ERR_INVALID_CBOR", _("The command contains invalid CBOR encoding")),
+        0xF2: ("OTP_ERR_INVALID_COMMAND", _("Unrecognized OTP command")),
+        0xF3: ("OTP_ERR_INVALID_PARAMETER", _("Invalid parameter in command")),
+        0xF4: ("OTP_ERR_GENERATOR_EXISTS", _("A generator with this name already exists")),
+        0xF5: ("OTP_ERR_GENERATOR_NOT_FOUND", _("Generator not found")),
+        0xF6: ("OTP_ERR_MEMORY_FULL", _("Memory full, unable to create another generator")),
+    }
+
+
+def hid_devices():
+    from fido2.hid import CtapHidDevice
+    return CtapHidDevice.list_devices()
+
+
+def pcsc_devices():
+    from fido2.pcsc import CtapPcscDevice
+    return CtapPcscDevice.list_devices()
+
+
+def hid_presence():
+    """Signature bon marché des devices HID branchés, sans ouvrir ni interroger aucun device :
+    nœuds /dev/hidraw* sous Linux, chemins des descripteurs ailleurs ; None si indisponible"""
+    try:
+        if sys.platform.startswith("linux"):
+            return frozenset(name for name in os.listdir("/dev") if name.startswith("hidraw"))
+        from fido2.hid import list_descriptors
+        return frozenset(str(d.path) for d in list_descriptors())
+    except Exception:
+        return None
+
+
+PRIORITY_INTERACTIVE = 0  # action utilisateur : clic HOTP, enrôlement, suppression
+PRIORITY_BACKGROUND = 1   # pings du détecteur et rafraîchissements périodiques
+
+# Pas de ping si une vraie commande a réussi il y a moins de N secondes
+PING_SKIP_WINDOW = 5.0
+
+# Sondes de présence, de la moins chère à la plus complète
+PROBE_NODE = "node"            # le nœud du device (/dev/hidrawN) existe encore
+PROBE_TRANSPORT = "transport"  # CTAPHID PING : écho au niveau transport, sans l'applet
+PROBE_OTP = "otp"              # OTP_ENUMERATE {1: 0, 2: 0} : seule sonde si la capacité est inconnue
+# Sonde OTP : total seul, sans page d'entrées ; une page complète peut dépasser max_msg_size
+OTP_PROBE_PAYLOAD = {1: 0, 2: 0}
+PROBE_TIMEOUT = 1.0
+
+# Disjoncteur de reconnexion : après une découverte sans résultat, le trafic de fond
+# échoue immédiatement pendant 0.5 s, puis 1 s, 2 s... jusqu'à 60 s, bien au-delà de la
+# période du détecteur (5 s). Un branchement le referme : changement des nœuds HID
+# (hid_presence) ou carte posée sur un lecteur PC/SC (DetectorWorker.on_card_inserted)
+RECONNECT_BACKOFF_MIN = 0.5
+RECONNECT_BACKOFF_MAX = 60.0
+
+# OTP_ENUMERATE : taille de page avant toute observation, et octets hors entrées
+# (statut, map, total, en-tête de tableau) réservés dans chaque réponse
+DEFAULT_ENUMERATE_BATCH = 23
+ENUMERATE_RESPONSE_OVERHEAD = 16
+
+# Énumération de démarrage (start_prefetch) : durée de validité et TOTP générés d'avance
+PREFETCH_TTL = 10.0
+PREFETCH_CODES = 10
+
+# Vérification après enrôlement : fenêtres TOTP comparées au calcul de référence (core.otp_reference)
+VERIFY_WINDOWS = 3
+
+# Délais maximaux (secondes) par type de commande et pour la découverte des devices
+COMMAND_TIMEOUTS = {
+    OTP_ENUMERATE: 3.0,
+    OTP_GENERATE: 3.0,
+    OTP_CREATE: 5.0,
+    OTP_DELETE: 5.0,
 }
+DEFAULT_COMMAND_TIMEOUT = 5.0
+DISCOVERY_TIMEOUT = 10.0
+
+class DeviceTimeoutError(Exception):
+    """Le device n'a pas répondu dans le délai imparti (distinct de CtapError et des erreurs USB)"""
+
+
+class OTPUnsupportedError(RuntimeError):
+    """Découverte vaine : chaque device candidat a refusé la sonde OTP par une erreur CTAP"""
+
+class IOThread:
+    """Thread d'E/S de longue durée d'un backend : exécute les échanges CTAP un par un,
+    reçus par une file. L'appelant attend le résultat avec son propre délai"""
 
-class FidoOTPBackend:
     def __init__(self):
-        self.lock = threading.RLock()  # RLock pour éviter les deadlocks
+        self._jobs = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="ctap-io", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, outcome, done = job
+            try:
+                outcome["result"] = fn()
+            except BaseException as e:
+                outcome["error"] = e
+            done.set()
+
+    def submit(self, fn):
+        outcome, done = {}, threading.Event()
+        self._jobs.put((fn, outcome, done))
+        return outcome, done
+
+    def retire(self):
+        """Le thread se termine dès la fin de l'échange en cours (bloqué ou non)"""
+        self._jobs.put(None)
+
+
+class DeviceLock:
+    """Verrou réentrant où les demandes interactives passent devant le trafic de fond.
+    Le verrou est pris commande par commande : une action utilisateur attend au
+    plus la fin de la commande en cours, jamais tout un rafraîchissement."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+        self._interactive_waiting = 0
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return True
+            if priority == PRIORITY_INTERACTIVE:
+                self._interactive_waiting += 1
+                try:
+                    while self._owner is not None:
+                        self._cond.wait()
+                finally:
+                    self._interactive_waiting -= 1
+            else:
+                # Le trafic de fond cède la place tant qu'une action utilisateur attend
+                while self._owner is not None or self._interactive_waiting:
+                    self._cond.wait()
+            self._owner = me
+            self._depth = 1
+            return True
+
+    def release(self):
+        with self._cond:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("DeviceLock released by a thread that does not own it")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._cond.notify_all()
+
+    def yield_if_contended(self) -> bool:
+        """Entre deux commandes d'une session longue : cède la place à une action utilisateur en attente"""
+        with self._cond:
+            if self._owner != threading.get_ident() or self._depth != 1 or not self._interactive_waiting:
+                return False
+        self.release()
+        self.acquire(PRIORITY_BACKGROUND)
+        return True
+
+    @contextmanager
+    def hold(self, priority=PRIORITY_INTERACTIVE):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FidoOTPBackend:
+    def __init__(self, command_timeouts=None, discovery_timeout=DISCOVERY_TIMEOUT,
+                 device_sources=None, device_wrapper=None):
+        """
+        device_sources: fonctions renvoyant les devices candidats, dans l'ordre de test
+            (par défaut HID puis PC/SC)
+        device_wrapper: fonction appliquée à chaque candidat (ex. enregistrement de trace)
+        """
+        if device_sources is None and device_wrapper is None:
+            # NEOOTP_RECORD / NEOOTP_REPLAY : enregistrement ou rejeu du trafic CTAP
+            if os.environ.get("NEOOTP_RECORD") or os.environ.get("NEOOTP_REPLAY"):
+                from core.ctap_trace import trace_options_from_env
+                options = trace_options_from_env()
+                device_sources = options.get("device_sources")
+                device_wrapper = options.get("device_wrapper")
+        self.device_sources = device_sources or [hid_devices, pcsc_devices]
+        self.device_wrapper = device_wrapper
+        self.lock = DeviceLock()  # réentrant, avec priorités
         self.ctap = None
         self.device = None
+        self._device_reader = None  # lecteur PC/SC du device connecté (None : HID)
         self.last_error = None
+        self.last_error_kind = None  # "ctap", "timeout", "communication", "connection" ou "unsupported"
         self.connection_valid = False
+        self.command_timeouts = {**COMMAND_TIMEOUTS, **(command_timeouts or {})}
+        self.discovery_timeout = discovery_timeout
+        self.last_activity = 0.0  # time.monotonic() de la dernière commande réussie
+        self._io = None  # IOThread, créé au premier échange
+        self._io_lock = threading.Lock()
+
+        # Cache des codes TOTP : (label, T) -> (code, expiration)
+        self._code_cache = {}
+        self._code_inflight = {}  # (label, T) -> [Event, résultat] (single-flight)
+        self._code_cache_lock = threading.Lock()
+        self._prefetched = None  # (time.monotonic(), générateurs) en attente de reprise
+        self._reconnect_backoff = 0.0  # 0 = disjoncteur fermé
+        self._reconnect_at = 0.0       # time.monotonic() avant lequel aucune découverte de fond
+        self._presence_at_failure = None  # hid_presence() lors de la dernière découverte vaine
+        self._otp_refusals = 0  # sondes OTP refusées (erreur CTAP) pendant la découverte en cours
+
+        # Devices déjà validés (applet OTP présente) : la revalidation se contente d'un ping transport
+        self._otp_capable = set()
+        self._enumerate_entry_size = None  # plus grande entrée OTP_ENUMERATE vue (octets CBOR)
+        self.probe_stats = {}  # sonde -> [nombre, durée totale, dernière durée] (secondes)
+        self.last_probe = None
 
     @staticmethod
     def get_error_message(code: int) -> str:
-        return OTP_ERROR_CODES.get(code, (_("Unknown error 0x{code:02X}").format(code=code), _("Undocumented error")))[1]
+        return otp_error_codes().get(code, (_("Unknown error 0x{code:02X}").format(code=code), _("Undocumented error")))[1]
+
+    def _command_timeout(self, command) -> float:
+        return self.command_timeouts.get(command, DEFAULT_COMMAND_TIMEOUT)
+
+    def _call_with_deadline(self, fn, timeout, device=None, event=None):
+        """Exécute fn sur le thread d'E/S du backend et abandonne après `timeout` secondes.
+        Une lecture HID bloquée ne peut pas être interrompue : on annule (event), on ferme
+        le transport et on retire ce thread d'E/S, qui se termine dès que l'échange rend
+        la main ; l'échange suivant part sur un nouveau thread."""
+        with self._io_lock:
+            io = self._io
+            if io is not None and threading.current_thread() is io.thread:
+                return fn()  # déjà sur le thread d'E/S (source de devices imbriquée)
+            if io is None:
+                io = self._io = IOThread()
+        outcome, done = io.submit(fn)
+        if not done.wait(timeout):
+            with self._io_lock:
+                if self._io is io:
+                    self._io = None
+            io.retire()
+            if event is not None:
+                event.set()
+            if device is not None:
+                try:
+                    device.close()
+                except Exception:
+                    pass
+            raise DeviceTimeoutError(_("Device did not respond within {timeout:g} s").format(timeout=timeout))
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _send_cbor(self, ctap, command, payload, timeout=None):
+        """send_cbor borné par le délai propre à la commande"""
+        event = threading.Event()
+        return self._call_with_deadline(
+            lambda: ctap.send_cbor(command, payload, event=event),
+            timeout or self._command_timeout(command),
+            device=ctap.device,
+            event=event,
+        )
 
     def _test_otp_support(self, ctap):
-        """Teste si le device supporte les commandes OTP"""
+        """Teste si le device supporte les commandes OTP.
+        True : oui ; False : refus CTAP explicite ; None : pas de réponse (délai, E/S)"""
         try:
-            ctap.send_cbor(OTP_ENUMERATE, {1: 0})
+            self._send_cbor(ctap, OTP_ENUMERATE, OTP_PROBE_PAYLOAD)
             return True
         except CtapError:
             return False
         except Exception:
-            return False
+            return None
 
-    def _connect(self):
-        """Connexion thread-safe avec validation OTP"""
-        # Si on a déjà une connexion valide, la tester rapidement
-        if self.connection_valid and self.ctap and self.device:
-            try:
-                return self.ctap
-            except Exception as e:
-                self._cleanup_connection()
+    @staticmethod
+    def _device_key(dev):
+        """Identité stable d'un device HID (None si inconnue : PC/SC, devices enveloppés)"""
+        descriptor = getattr(dev, "descriptor", None)
+        if descriptor is None:
+            return None
+        return (descriptor.vid, descriptor.pid, descriptor.serial_number, descriptor.path)
 
-        self._cleanup_connection()
+    @staticmethod
+    def _device_node(dev):
+        """Chemin du nœud du device s'il est vérifiable par le système de fichiers (Linux)"""
+        path = getattr(getattr(dev, "descriptor", None), "path", None)
+        if isinstance(path, bytes):
+            path = path.decode(errors="ignore")
+        return path if isinstance(path, str) and path.startswith("/dev/") else None
 
-        # 1) Test des devices HID
+    def _try_device(self, dev, deadline):
+        """Ouvre un device candidat ; renvoie le Ctap2 s'il supporte l'applet OTP"""
+        from fido2.ctap2 import Ctap2
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeviceTimeoutError(_("Device discovery timed out"))
         try:
-            hid_devs = list(CtapHidDevice.list_devices())
-        except Exception as e:
-            hid_devs = []
+            ctap = self._call_with_deadline(lambda: Ctap2(dev), min(remaining, self._command_timeout(None)), device=dev)
+            key = self._device_key(dev)
+            # getInfo vient de répondre : un device déjà validé n'a pas à rejouer la commande OTP
+            if key is not None and key in self._otp_capable:
+                return ctap
+            start = time.perf_counter()
+            supported = self._test_otp_support(ctap)
+            self._record_probe(PROBE_OTP, start)
+            if supported is False:
+                self._otp_refusals += 1
+            if supported:
+                if key is not None:
+                    self._otp_capable.add(key)
+                return ctap
+        except DeviceTimeoutError:
+            pass
+        except Exception:
+            pass
+        try:
+            dev.close()
+        except Exception:
+            pass
+        return None
 
-        for i, dev in enumerate(hid_devs):
-            try:
-                ctap = Ctap2(dev)
-                if self._test_otp_support(ctap):
-                    self.ctap = ctap
-                    self.device = dev
-                    self.connection_valid = True
-                    self.last_error = None
-                    return self.ctap
-                else:
-                    self._cleanup_connection()
-            except Exception as e:
-                self._cleanup_connection()
+    def _connect(self, sources=None, priority=PRIORITY_INTERACTIVE):
+        """Connexion thread-safe avec validation OTP
+        sources: fonctions de découverte à utiliser à la place de device_sources
+        priority: le trafic de fond respecte le disjoncteur, pas les actions utilisateur"""
+        # Si on a déjà une connexion valide, la réutiliser
+        if self.connection_valid and self.ctap and self.device:
+            return self.ctap
 
-        # 2) Test des devices PC/SC
-        try:
-            pcsc_devs = list(CtapPcscDevice.list_devices())
-        except Exception as e:
-            pcsc_devs = []
+        if sources is None and priority != PRIORITY_INTERACTIVE and time.monotonic() < self._reconnect_at:
+            presence = hid_presence()
+            if presence is None or presence == self._presence_at_failure:
+                # Disjoncteur ouvert : échec immédiat, sans rescanner HID et PC/SC
+                raise RuntimeError(_("⚠️ No OTP Device detected."))
+            self.reset_backoff()  # nœud HID apparu ou disparu : branchement, on rescanne
+
+        self._cleanup_connection()
+        deadline = time.monotonic() + self.discovery_timeout
+        self._otp_refusals = 0
+        tried = 0
 
-        for i, dev in enumerate(pcsc_devs):
+        # 1) Devices HID, puis 2) devices PC/SC (ou sources injectées)
+        for list_devices in sources or self.device_sources:
             try:
-                ctap = Ctap2(dev)
-                if self._test_otp_support(ctap):
+                devs = self._call_with_deadline(lambda: list(list_devices()),
+                                                max(deadline - time.monotonic(), 0.1))
+            except Exception:
+                devs = []
+
+            for dev in devs:
+                if self.device_wrapper is not None:
+                    dev = self.device_wrapper(dev)
+                tried += 1
+                ctap = self._try_device(dev, deadline)
+                if ctap is not None:
                     self.ctap = ctap
                     self.device = dev
+                    self._device_reader = getattr(dev, "_name", None)  # CtapPcscDevice : nom du lecteur
                     self.connection_valid = True
                     self.last_error = None
+                    self.reset_backoff()
                     return self.ctap
-                else:
-                    self._cleanup_connection()
-            except Exception as e:
-                self._cleanup_connection()
 
         # Aucun device compatible trouvé
         self._cleanup_connection()
+        if sources is None:
+            self._presence_at_failure = hid_presence()
+            self._reconnect_backoff = min(max(self._reconnect_backoff * 2, RECONNECT_BACKOFF_MIN),
+                                          RECONNECT_BACKOFF_MAX)
+            self._reconnect_at = time.monotonic() + self._reconnect_backoff
+        if tried and self._otp_refusals == tried:
+            raise OTPUnsupportedError(_("⚠️ No OTP Device detected."))
         raise RuntimeError(_("⚠️ No OTP Device detected."))
 
     def _cleanup_connection(self):
         """Nettoie la connexion actuelle"""
         self.connection_valid = False
+        self.clear_code_cache()
+        self._prefetched = None
+        self._enumerate_entry_size = None  # le prochain device peut avoir d'autres labels
         if self.device:
-            self.device.close()
+            try:
+                self.device.close()
+            except Exception:
+                pass
         self.ctap = None
         self.device = None
+        self._device_reader = None
 
-    def _execute_command(self, command, payload, operation_name="operation"):
+    def _execute_command(self, command, payload, operation_name="operation", priority=PRIORITY_INTERACTIVE):
         """Exécute une commande CTAP avec gestion d'erreur uniforme"""
-        with self.lock:
+        with self.lock.hold(priority):
             try:
-                ctap = self._connect()
-                result = ctap.send_cbor(command, payload)
+                ctap = self._connect(priority=priority)
+                result = self._send_cbor(ctap, command, payload)
+                self.last_activity = time.monotonic()
                 return True, result
             except CtapError as e:
                 error_msg = self.get_error_message(e.code)
                 self.last_error = error_msg
+                self.last_error_kind = "ctap"
                 # Ne pas invalider la connexion pour les erreurs CTAP logiques
                 return False, None
+            except DeviceTimeoutError as e:
+                # Device muet : transport déjà fermé, la connexion est perdue
+                self._cleanup_connection()
+                self.last_error = str(e)
+                self.last_error_kind = "timeout"
+                return False, None
             except (OSError, IOError, ConnectionError) as e:
                 # Erreur de communication/USB
                 self._cleanup_connection()
                 self.last_error = _("Device communication error")
+                self.last_error_kind = "communication"
+                return False, None
+            except OTPUnsupportedError as e:
+                # Devices présents mais sans applet OTP : refus explicite, pas une panne
+                self._cleanup_connection()
+                self.last_error = str(e)
+                self.last_error_kind = "unsupported"
                 return False, None
             except (Exception, RuntimeError) as e:
                 # Erreur de connexion/communication → invalider la connexion
                 self._cleanup_connection()
                 self.last_error = str(e)
+                self.last_error_kind = "connection"
                 return False, None
 
-    def ping_device(self) -> bool:
-        """Test de présence du device"""
-        success, _ = self._execute_command(OTP_ENUMERATE, {1: 0}, "ping")
+    def connect_from(self, list_devices, priority=PRIORITY_INTERACTIVE, reader=None) -> bool:
+        """Connexion immédiate aux devices d'une seule source (carte posée sur un lecteur).
+        La connexion en cours (token USB...) n'est remplacée que par un device qui a
+        passé le test OTP : un badge ou une carte bancaire posé ne la coupe pas."""
+        with self.lock.hold(priority):
+            deadline = time.monotonic() + self.discovery_timeout
+            try:
+                devs = self._call_with_deadline(lambda: list(list_devices()), self.discovery_timeout)
+            except Exception:
+                devs = []
+            for dev in devs:
+                if self.device_wrapper is not None:
+                    dev = self.device_wrapper(dev)
+                try:
+                    ctap = self._try_device(dev, deadline)
+                except DeviceTimeoutError:
+                    break
+                if ctap is not None:
+                    self._cleanup_connection()
+                    self.ctap = ctap
+                    self.device = dev
+                    self._device_reader = reader or getattr(dev, "_name", None)
+                    self.connection_valid = True
+                    self.last_error = None
+                    self.reset_backoff()
+                    return True
+            self.last_error = _("⚠️ No OTP Device detected.")
+            self.last_error_kind = "connection"
+            return False
+
+    def reset_backoff(self):
+        """Referme le disjoncteur (connexion réussie, évènement de branchement)"""
+        self._reconnect_backoff = 0.0
+        self._reconnect_at = 0.0
+
+    def invalidate_connection(self, reader=None):
+        """Oublie la connexion courante (carte retirée) : la commande suivante relance la découverte.
+        reader: seulement si le device connecté vient de ce lecteur"""
+        with self.lock.hold(PRIORITY_INTERACTIVE):
+            if reader is not None and reader != self._device_reader:
+                return
+            self._cleanup_connection()
+
+    def _record_probe(self, probe, start):
+        elapsed = time.perf_counter() - start
+        stats = self.probe_stats.setdefault(probe, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = elapsed
+        self.last_probe = probe
+
+    def probe_report(self) -> dict:
+        """Temps aller-retour des sondes : {sonde: {count, avg_ms, last_ms}}"""
+        return {probe: {"count": count, "avg_ms": round(total * 1000 / count, 2),
+                        "last_ms": round(last * 1000, 2)}
+                for probe, (count, total, last) in self.probe_stats.items()}
+
+    def _probe_connection(self, priority):
+        """Sondes légères sur la connexion établie : True vivant, False perdu, None indécis"""
+        with self.lock.hold(priority):
+            if not (self.connection_valid and self.device):
+                return None
+            device = self.device
+            start = time.perf_counter()
+            node = self._device_node(device)
+            if node is not None and not os.path.exists(node):
+                self._record_probe(PROBE_NODE, start)
+                self._cleanup_connection()  # débranché : inutile d'interroger le transport
+                return False
+            ping = getattr(device, "ping", None)
+            if ping is None:
+                return None  # transport sans ping (PC/SC, trace) : commande OTP
+            try:
+                self._call_with_deadline(ping, PROBE_TIMEOUT, device=device)
+            except Exception:
+                self._record_probe(PROBE_TRANSPORT, start)
+                self._cleanup_connection()
+                return False
+            self._record_probe(PROBE_TRANSPORT, start)
+            self.last_activity = time.monotonic()
+            return True
+
+    def ping_device(self, priority=PRIORITY_BACKGROUND) -> bool:
+        """Test de présence du device, par la sonde suffisante la moins chère :
+        trafic récent, nœud du device, ping transport, puis commande OTP (avec découverte)"""
+        if self.connection_valid and time.monotonic() - self.last_activity < PING_SKIP_WINDOW:
+            return True  # Le trafic récent prouve déjà que le device répond
+        if self._probe_connection(priority):
+            return True
+        start = time.perf_counter()
+        success, _ = self._execute_command(OTP_ENUMERATE, OTP_PROBE_PAYLOAD, "ping", priority)
+        self._record_probe(PROBE_OTP, start)
         return success
 
-    def list_generators(self, index=0, count=None):
+    def list_generators(self, index=0, count=None, priority=PRIORITY_INTERACTIVE):
         """Liste les générateurs OTP (23 max)"""
         params = {1: index}
         if count is not None:
             params[2] = count
 
-        success, result = self._execute_command(OTP_ENUMERATE, params, operation_name="list_generators")
+        success, result = self._execute_command(OTP_ENUMERATE, params, "list_generators", priority)
 
         if success:
             # Si count=0, renvoyer juste le nombre total
@@ -158,32 +570,59 @@ class FidoOTPBackend:
         else:  # Erreur de connexion
             return None
         
-    def get_all_generators(self):
-        """Récupère tous les générateurs OTP"""
+    def get_all_generators(self, priority=PRIORITY_INTERACTIVE, cancelled=None):
+        """Récupère tous les générateurs OTP
+        cancelled: callable optionnel, consulté entre deux commandes ; renvoie None si annulé"""
+        # Reprise de l'énumération de démarrage : attend sa fin si elle tient le verrou
+        with self.lock.hold(priority):
+            prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None and time.monotonic() - prefetched[0] < PREFETCH_TTL:
+            return prefetched[1]
+
         try:
             all_generators = []
-
-            # 1. Récupérer le nombre total (exactement comme dans votre worker)
-            total = self.list_generators(index=0, count=0)
-            if total is None or total is False or not isinstance(total, int):
-                return None
-
-            batch_size = 23
+            total = None  # connu dès la première page (clé 1 de la réponse)
             index = 0
+            batch_size = self._enumerate_batch_size()
+            size_cap = None  # plus grande taille de page sans échec après un refus du device
 
-            # 2. Lire par batchs (exactement comme dans votre worker)
-            while index < total:
-                count = min(batch_size, total - index)
-                batch = self.list_generators(index=index, count=count)
-                if batch is None:
+            while total is None or index < total:
+                if cancelled and cancelled():
                     return None
-                elif batch is False:
-                    # Erreur CTAP sur ce batch, continuer avec le batch suivant
-                    index += count
+                count = batch_size if total is None else min(batch_size, total - index)
+                success, result = self._execute_command(OTP_ENUMERATE, {1: index, 2: count},
+                                                        "list_generators", priority)
+                if not success:
+                    if self.last_error_kind != "ctap":
+                        return None  # connexion perdue
+                    if count > 1:
+                        # Réponse trop grande (ou refus) : on réessaie la même page, deux fois plus petite
+                        batch_size = size_cap = max(count // 2, 1)
+                        continue
+                    if total is None:
+                        # Même une entrée est refusée : le total (requête de comptage) borne la boucle
+                        total = self.list_generators(index=0, count=0, priority=priority)
+                        if not isinstance(total, int):
+                            return None
+                        continue
+                    index += 1  # entrée illisible même seule : on la saute
                     continue
 
+                if total is None:
+                    total = result.get(1)
+                    if not isinstance(total, int):
+                        # Device qui n'indique pas le total dans les pages : requête de comptage
+                        total = self.list_generators(index=0, count=0, priority=priority)
+                        if not isinstance(total, int):
+                            return None
+                batch = result.get(2, [])
+                if not batch:
+                    break
                 all_generators.extend(batch)
                 index += len(batch)
+                batch_size = self._enumerate_batch_size(batch)
+                if size_cap is not None:
+                    batch_size = min(batch_size, size_cap)
 
             return all_generators
             
@@ -191,14 +630,116 @@ class FidoOTPBackend:
             self.last_error = str(e)
             return None
 
-    def generate_code(self, label: str, otp_type: int, period: int = None):
-        """Génère un code OTP"""
-        payload = {1: label}
-        if otp_type == 2:  # TOTP
-            T = int(time.time()) // (period or 30)
-            payload[2] = T.to_bytes(8, 'big')
-        
-        success, result = self._execute_command(OTP_GENERATE, payload, f"generate_code({label})")
+    def _enumerate_batch_size(self, batch=None) -> int:
+        """Taille de page OTP_ENUMERATE qui tient dans le max_msg_size annoncé par le device,
+        d'après la plus grande entrée observée (23 tant que rien n'est observé)"""
+        if batch:
+            from fido2 import cbor
+            largest = max(len(cbor.encode(entry)) for entry in batch)
+            self._enumerate_entry_size = max(self._enumerate_entry_size or 0, largest)
+        ctap = self.ctap
+        if not self._enumerate_entry_size or ctap is None:
+            return DEFAULT_ENUMERATE_BATCH
+        max_msg_size = getattr(ctap.info, "max_msg_size", None) or 1024
+        budget = max_msg_size - ENUMERATE_RESPONSE_OVERHEAD
+        return max(budget // self._enumerate_entry_size, 1)
+
+    def start_prefetch(self):
+        """Lance découverte et première énumération en tâche de fond, en parallèle
+        de la construction de l'interface ; le premier refresh en reprend le résultat"""
+        thread = threading.Thread(target=self.prefetch, name="device-prefetch", daemon=True)
+        thread.start()
+        return thread
+
+    def prefetch(self, code_budget=PREFETCH_CODES):
+        """Énumère et met en cache les premiers codes TOTP, verrou tenu de bout en bout"""
+        with self.lock.hold(PRIORITY_BACKGROUND):
+            generators = self.get_all_generators(priority=PRIORITY_BACKGROUND)
+            if not generators:
+                return False
+            self._prefetched = (time.monotonic(), generators)
+            # Mêmes générateurs, dans le même ordre, que le premier écran du refresh
+            first_page = [g for g in generators if g.get(2) == 2][:code_budget]
+            self.generate_codes([g.get(1) for g in first_page],
+                                periods={g.get(1): g.get(6, 30) for g in first_page})
+            return True
+
+    def clear_code_cache(self, label: str = None):
+        """Invalide le cache TOTP (tout, ou un seul générateur)"""
+        with self._code_cache_lock:
+            if label is None:
+                self._code_cache.clear()
+            else:
+                for key in [k for k in self._code_cache if k[0] == label]:
+                    del self._code_cache[key]
+
+    def cached_code(self, label: str, period: int = None):
+        """Code TOTP de la fenêtre courante s'il est déjà en cache, sans accès au device"""
+        period = period or 30
+        now = time.time()
+        with self._code_cache_lock:
+            entry = self._code_cache.get((label, int(now) // period))
+        if entry and now < entry[1]:
+            return entry[0]
+        return None
+
+    def _claim_code(self, key, now):
+        """Code déjà en cache, ou vol single-flight de (label, T).
+        Renvoie (code, vol, meneur) : vol None si le code est en cache ;
+        meneur False si un autre appelant interroge déjà le device"""
+        with self._code_cache_lock:
+            entry = self._code_cache.get(key)
+            if entry and now < entry[1]:
+                return entry[0], None, False
+            flight = self._code_inflight.get(key)
+            if flight is not None:
+                return None, flight, False
+            # [terminé, code, abandonné]
+            flight = self._code_inflight[key] = [threading.Event(), None, False]
+            return None, flight, True
+
+    def _finish_flight(self, key, flight, code, expires, abandoned=False):
+        """Publie le code d'un vol et le met en cache jusqu'à la frontière de période.
+        abandoned: le device n'a pas répondu pour ce label ; les appelants en attente
+        réessaient eux-mêmes au lieu de recevoir None"""
+        with self._code_cache_lock:
+            if self._code_inflight.get(key) is flight:
+                del self._code_inflight[key]
+            now = time.time()
+            if code and now < expires:
+                # Purge des fenêtres expirées puis stockage
+                for k in [k for k, (_code, until) in self._code_cache.items() if until <= now]:
+                    del self._code_cache[k]
+                self._code_cache[key] = (code, expires)
+        flight[1] = code
+        flight[2] = abandoned
+        flight[0].set()
+
+    def _get_totp_code(self, label: str, period: int, priority=PRIORITY_INTERACTIVE):
+        """Code TOTP via le cache : au plus une commande par (label, fenêtre)"""
+        while True:
+            now = time.time()
+            T = int(now) // period
+            key = (label, T)
+            code, flight, leader = self._claim_code(key, now)
+            if flight is None:
+                return code
+            if not leader:
+                # Une autre requête interroge déjà le device pour ce label : une seule commande
+                flight[0].wait()
+                if flight[2]:
+                    continue  # vol abandonné (lot annulé, connexion perdue) : on réessaie
+                return flight[1]
+
+            result = None
+            try:
+                result = self._send_generate(label, {1: label, 2: T.to_bytes(8, 'big')}, priority)
+                return result
+            finally:
+                self._finish_flight(key, flight, result, (T + 1) * period)
+
+    def _send_generate(self, label: str, payload: dict, priority=PRIORITY_INTERACTIVE):
+        success, result = self._execute_command(OTP_GENERATE, payload, f"generate_code({label})", priority)
         if success:
             return result.get(1, "?")
         elif success is False:  # Erreur CTAP
@@ -206,15 +747,143 @@ class FidoOTPBackend:
         else:  # Erreur de connexion
             return None
 
+    def generate_codes(self, labels, at_time=None, periods=None, priority=PRIORITY_BACKGROUND, cancelled=None,
+                       on_result=None):
+        """Codes TOTP de plusieurs générateurs en une seule session device.
+        T est calculé une fois par période à partir de at_time (time.time() par défaut) :
+        tous les codes d'un appel appartiennent à la même fenêtre.
+        periods: {label: période}, 30 s par défaut.
+        Renvoie {label: code} ; False pour un label refusé par le device (les autres
+        continuent), None pour les labels non traités après une perte de connexion.
+        on_result(label, code): appelé dès que chaque code est connu (cache d'abord), dans l'ordre."""
+        at_time = time.time() if at_time is None else at_time
+        periods = periods or {}
+        windows = {}  # période -> T, calculé une fois par groupe
+        keys = {}
+        for label in labels:
+            period = periods.get(label) or 30
+            if period not in windows:
+                windows[period] = int(at_time) // period
+            keys[label] = (label, windows[period], period)
+
+        results = {}
+        pending = []  # labels que ce lot enverra lui-même au device
+        waiting = {}  # label -> vol mené par un autre appelant
+        now = time.time()
+        for label, key in keys.items():
+            with self._code_cache_lock:
+                entry = self._code_cache.get(key[:2])
+                flight = self._code_inflight.get(key[:2])
+            if entry and now < entry[1]:
+                results[label] = entry[0]
+            elif flight is not None:
+                waiting[label] = flight
+            else:
+                # Pas encore de vol : il n'est ouvert que juste avant l'OTP_GENERATE du label,
+                # une copie interactive d'un label encore en file ne l'attend donc pas
+                pending.append(label)
+        if on_result:
+            for label, code in list(results.items()):
+                on_result(label, code)
+
+        if pending:
+            self._generate_batch(pending, keys, results, waiting, priority, cancelled, on_result)
+            for label in pending:
+                results.setdefault(label, None)  # non traité : lot annulé ou connexion perdue
+        for label, flight in waiting.items():
+            flight[0].wait()
+            if flight[2] and not (cancelled and cancelled()):
+                # Le meneur a abandonné ce label : nouvelle tentative pour la même fenêtre
+                code = self.generate_codes([label], at_time, periods, priority, cancelled).get(label)
+            else:
+                code = flight[1]
+            results[label] = code
+            if on_result and code is not None:
+                on_result(label, code)
+        return results
+
+    def _generate_batch(self, labels, keys, results, waiting, priority, cancelled, on_result=None):
+        """Une commande OTP_GENERATE par label, requêtes CBOR encodées d'avance, verrou tenu.
+        Le vol single-flight d'un label n'est ouvert qu'au moment de l'envoyer : déjà en
+        cache ou demandé entre-temps par un autre appelant, il n'est pas renvoyé (waiting)"""
+        from fido2 import cbor
+        from fido2.hid import CTAPHID
+        requests = [(label, bytes([OTP_GENERATE]) + cbor.encode({1: label, 2: keys[label][1].to_bytes(8, 'big')}))
+                    for label in labels]
+        timeout = self._command_timeout(OTP_GENERATE)
+        with self.lock.hold(priority):
+            try:
+                ctap = self._connect(priority=priority)
+            except Exception as e:
+                self.last_error = str(e)
+                self.last_error_kind = "connection"
+                return
+            device = ctap.device
+            for label, request in requests:
+                if cancelled and cancelled():
+                    return
+                if priority != PRIORITY_INTERACTIVE and self.lock.yield_if_contended():
+                    # Une action utilisateur est passée : la connexion a pu changer
+                    try:
+                        device = self._connect(priority=priority).device
+                    except Exception as e:
+                        self.last_error = str(e)
+                        self.last_error_kind = "connection"
+                        return
+                _label, T, period = keys[label]
+                code, flight, leader = self._claim_code((label, T), time.time())
+                if flight is None:
+                    results[label] = code
+                elif not leader:
+                    waiting[label] = flight
+                    continue
+                else:
+                    event = threading.Event()
+                    try:
+                        response = self._call_with_deadline(
+                            lambda: device.call(CTAPHID.CBOR, request, event), timeout, device=device, event=event)
+                    except DeviceTimeoutError as e:
+                        self._finish_flight((label, T), flight, None, 0, abandoned=True)
+                        self._cleanup_connection()
+                        self.last_error = str(e)
+                        self.last_error_kind = "timeout"
+                        return
+                    except Exception:
+                        self._finish_flight((label, T), flight, None, 0, abandoned=True)
+                        self._cleanup_connection()
+                        self.last_error = _("Device communication error")
+                        self.last_error_kind = "communication"
+                        return
+                    if response[0]:
+                        results[label] = False
+                        self.last_error = self.get_error_message(response[0])
+                        self.last_error_kind = "ctap"
+                    else:
+                        results[label] = cbor.decode(response[1:]).get(1, "?")
+                        self.last_activity = time.monotonic()
+                    self._finish_flight((label, T), flight, results[label], (T + 1) * period)
+                if on_result:
+                    on_result(label, results[label])
+
+    def generate_code(self, label: str, otp_type: int, period: int = None, priority=PRIORITY_INTERACTIVE):
+        """Génère un code OTP (les TOTP passent par le cache par fenêtre)"""
+        if otp_type == 2:  # TOTP
+            return self._get_totp_code(label, period or 30, priority)
+        return self._send_generate(label, {1: label}, priority)
+
     def delete_generator(self, label: str) -> bool:
         """Supprime un générateur"""
         payload = {1: label}
         success, _ = self._execute_command(OTP_DELETE, payload, f"delete_generator({label})")
+        self.clear_code_cache(label)
+        self._prefetched = None
         return success
 
     def create_generator(self, label: str, otp_type: str, secret_b32: str, algo: str,
-                        digits: int = 6, counter: int = None, period: int = None) -> bool:
-        """Crée un nouveau générateur"""
+                        digits: int = 6, counter: int = None, period: int = None, verify: bool = False) -> bool:
+        """Crée un nouveau générateur
+        verify: un TOTP est relu sur quelques fenêtres tant que la graine est en mémoire ;
+        s'il ne donne pas les codes attendus, il est supprimé et la création échoue"""
         try:
             secret = b32decode(secret_b32, casefold=True)
         except Exception as e:
@@ -237,5 +906,31 @@ class FidoOTPBackend:
         if otp_type == "TOTP" and period is not None:
             payload[6] = period
 
-        success, _ = self._execute_command(OTP_CREATE, payload, f"create_generator({label})")
-        return success
\ No newline at end of file
+        success, _response = self._execute_command(OTP_CREATE, payload, f"create_generator({label})")
+        self.clear_code_cache(label)
+        self._prefetched = None
+        if success and verify and otp_type == "TOTP":
+            if self.verify_generator(label, secret_b32, algo, digits, period or 30) is False:
+                self.delete_generator(label)
+                self.last_error = _("The token does not return the expected codes: the secret key was not stored correctly")
+                self.last_error_kind = "verify"
+                return False
+        return success
+
+    def verify_generator(self, label: str, secret_b32: str, algo: str, digits: int = 6, period: int = 30,
+                         windows: int = VERIFY_WINDOWS):
+        """Compare les codes TOTP du device (fenêtre courante et suivantes) au calcul de référence.
+        True si identiques, False au premier écart, None si le device n'a pas répondu"""
+        from core.otp_reference import totp_window_codes
+        secret = b32decode(secret_b32, casefold=True)
+        first = int(time.time()) // period
+        expected = totp_window_codes(secret, first, windows, digits, ALG_NAME_TO_CODE[algo])
+        for offset, code in enumerate(expected):
+            device_code = self.generate_codes([label], at_time=(first + offset) * period,
+                                              periods={label: period},
+                                              priority=PRIORITY_INTERACTIVE).get(label)
+            if not device_code:
+                return None
+            if device_code != code:
+                return False
+        return True
\ No newline at end of file
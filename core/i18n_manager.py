@@ -3,6 +3,12 @@ import os
 from pathlib import Path
 import locale
 
+_current_language = "en"
+
+def current_language() -> str:
+    """Langue active choisie par setup_i18n (sert de clé aux caches de textes traduits)"""
+    return _current_language
+
 def setup_i18n():
     """Configure l'internationalisation au démarrage de l'app"""
     
@@ -18,6 +24,9 @@ def setup_i18n():
     except Exception:
         language = "en"
         
+    global _current_language
+    _current_language = language
+
     # Nom de domaine (doit correspondre au nom de vos fichiers .po/.mo)
     domain = 'messages'
     
@@ -0,0 +1,262 @@
+# core/otp_daemon.py
+# Service résident : possède l'unique session FidoOTPBackend et sert les
+# codes aux clients locaux (GUI, CLI, helper navigateur) via un socket Unix.
+# Les codes TOTP viennent du cache par fenêtre du backend.
+#
+# Protocole : chaque trame = longueur sur 4 octets (big-endian) + JSON UTF-8.
+#   {"cmd": "list"}                  -> {"ok": true, "generators": [...]}
+#   {"cmd": "code", "label": "..."}  -> {"ok": true, "code": "...", "valid_until": 1700000000}
+#   {"cmd": "hotp", "label": "..."}  -> {"ok": true, "code": "..."}
+#   {"cmd": "status"}                -> {"ok": true, "connected": true, "probe": "transport",
+#                                        "probes": {"transport": {"count", "avg_ms", "last_ms"}, ...}}
+# En cas d'erreur : {"ok": false, "error": "..."}
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+
+from core.fido_backend import FidoOTPBackend, PRIORITY_INTERACTIVE
+from core.otp_model import OTPGenerator, TYPE_NAME
+
+MAX_FRAME_SIZE = 64 * 1024
+LIST_CACHE_TTL = 5.0  # secondes avant de ré-énumérer le token
+RELIST_MIN_INTERVAL = 2.0  # label inconnu : au plus une ré-énumération forcée par intervalle
+_HEADER = struct.Struct(">I")
+
+
+def default_socket_path() -> str:
+    """Chemin du socket propre à l'utilisateur"""
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(base, f"NeoOTP-{uid}.sock")
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def send_frame(sock, message: dict):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """Lit une trame ; renvoie None si le pair a fermé la connexion"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(_("Frame too large ({size} bytes)").format(size=size))
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (ValueError, OSError):
+                return
+            if request is None:
+                return
+            try:
+                response = service.handle_request(request)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            try:
+                send_frame(self.request, response)
+            except OSError:
+                return
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # beaucoup de clients peuvent se connecter en même temps
+
+
+class OTPDaemon:
+    """Partage une seule session device entre de nombreux clients concurrents"""
+
+    def __init__(self, socket_path=None, backend=None):
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError(_("Unix sockets are not supported on this platform"))
+        self.socket_path = socket_path or default_socket_path()
+        self.backend = backend or FidoOTPBackend()
+        self.server = None
+
+        self._generators = {}  # label -> OTPGenerator
+        self._generators_time = 0.0
+        self._generators_lock = threading.Lock()
+
+    # --- accès au device ---
+    def _get_generators(self, force=False):
+        with self._generators_lock:
+            now = time.monotonic()
+            if force and now - self._generators_time < RELIST_MIN_INTERVAL:
+                force = False  # liste toute récente : un label inconnu ne relance pas le device
+            if force or not self._generators or now - self._generators_time > LIST_CACHE_TTL:
+                all_generators = self.backend.get_all_generators()
+                if all_generators is None:
+                    raise RuntimeError(self.backend.last_error or _("Device not detected"))
+                self._generators = {g.get(1): OTPGenerator(g) for g in all_generators}
+                self._generators_time = now
+            return self._generators
+
+    def _find_generator(self, label):
+        generator = self._get_generators().get(label)
+        if generator is None:
+            # Peut-être enrôlé depuis la dernière énumération ; des requêtes répétées pour un
+            # label inconnu partagent la même ré-énumération (RELIST_MIN_INTERVAL)
+            generator = self._get_generators(force=True).get(label)
+        if generator is None:
+            raise KeyError(_("Generator not found"))
+        return generator
+
+    def _totp_code(self, generator):
+        period = generator.period or 30
+        at_time = time.time()
+        T = int(at_time) // period
+        # Code demandé pour cette fenêtre précise : valid_until et code viennent du même T.
+        # Le cache du backend garantit une seule commande par fenêtre, même avec N clients
+        code = self.backend.generate_codes([generator.label], at_time=at_time,
+                                           periods={generator.label: period},
+                                           priority=PRIORITY_INTERACTIVE).get(generator.label)
+        if not code:
+            raise RuntimeError(self.backend.last_error or _("Error"))
+        return code, (T + 1) * period
+
+    # --- protocole ---
+    def handle_request(self, request: dict) -> dict:
+        cmd = request.get("cmd")
+        try:
+            if cmd == "list":
+                generators = self._get_generators()
+                return {"ok": True, "generators": [
+                    {
+                        "label": g.label,
+                        "type": TYPE_NAME.get(g.otp_type, "?"),
+                        "digits": g.digits,
+                        "period": g.period,
+                    }
+                    for g in generators.values()
+                ]}
+            if cmd == "code":
+                generator = self._find_generator(request.get("label"))
+                if generator.otp_type != 2:
+                    return {"ok": False, "error": _("Not a TOTP generator")}
+                code, valid_until = self._totp_code(generator)
+                return {"ok": True, "code": code, "valid_until": valid_until}
+            if cmd == "hotp":
+                generator = self._find_generator(request.get("label"))
+                if generator.otp_type != 1:
+                    return {"ok": False, "error": _("Not a HOTP generator")}
+                code = self.backend.generate_code(generator.label, generator.otp_type)
+                if not code:
+                    return {"ok": False, "error": self.backend.last_error or _("Error")}
+                return {"ok": True, "code": code}
+            if cmd == "status":
+                connected = self.backend.ping_device()
+                return {"ok": True, "connected": connected, "probe": self.backend.last_probe,
+                        "probes": self.backend.probe_report()}
+            return {"ok": False, "error": _("Unknown command")}
+        except KeyError as e:
+            return {"ok": False, "error": e.args[0]}
+        except RuntimeError as e:
+            return {"ok": False, "error": str(e)}
+
+    # --- cycle de vie ---
+    def _socket_in_use(self) -> bool:
+        """Un service répond-il déjà sur socket_path ? Seul un refus de connexion désigne un socket orphelin"""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+            return True
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+        except OSError:
+            return True  # état inconnu (droits...) : ne jamais supprimer le socket d'un autre
+        finally:
+            probe.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            if self._socket_in_use():
+                raise RuntimeError(_("A NeoOTP service is already running on {path}").format(
+                    path=self.socket_path))
+            os.remove(self.socket_path)  # socket orphelin d'une instance précédente
+        old_umask = os.umask(0o077)  # socket lisible par l'utilisateur seulement
+        try:
+            self.server = _ThreadingUnixServer(self.socket_path, _ClientHandler)
+        finally:
+            os.umask(old_umask)
+        self.server.service = self
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+
+    def close(self):
+        if self.server:
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)  # seulement le socket de ce service
+        with self.backend.lock:
+            self.backend._cleanup_connection()
+
+
+class OTPDaemonClient:
+    """Client minimal du service résident"""
+
+    def __init__(self, socket_path=None, timeout=10.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path or default_socket_path())
+        self.sock.settimeout(timeout)
+
+    def _call(self, request: dict) -> dict:
+        send_frame(self.sock, request)
+        response = recv_frame(self.sock)
+        if response is None:
+            raise ConnectionError(_("Connection closed by the OTP service"))
+        return response
+
+    def list_generators(self):
+        return self._call({"cmd": "list"})
+
+    def get_code(self, label: str):
+        return self._call({"cmd": "code", "label": label})
+
+    def generate_hotp(self, label: str):
+        return self._call({"cmd": "hotp", "label": label})
+
+    def status(self):
+        return self._call({"cmd": "status"})
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,7 +1,9 @@
 # core/otp_model.py
-# Transforme la map CBOR recue d'OTP_ENUMERATE en un objet Python
+# Transforme la map CBOR recue d'OTP_ENUMERATE en un objet Python immuable
 # et une méthode pour afficher les paramètres
 
+from core.i18n_manager import current_language
+
 ALG_CODE_TO_NAME = {
     4: "SHA1",
     5: "SHA256",
@@ -11,20 +13,52 @@ ALG_CODE_TO_NAME = {
 TYPE_NAME = {1: "HOTP", 2: "TOTP"}
 
 class OTPGenerator:
+    """Enregistrement immuable, partagé tel quel entre le worker et l'UI.
+    Le label et le compteur sont décodés une seule fois ; le texte des
+    paramètres est calculé à la demande puis mis en cache par langue."""
+
+    __slots__ = ("label", "otp_type", "alg", "digits", "counter", "period",
+                 "account", "issuer", "counter_value", "_display_cache")
+
     def __init__(self, data: dict):
-        self.label = data.get(1)
-        self.otp_type = data.get(2)  # 1 = HOTP, 2 = TOTP
-        self.alg = data.get(3)
-        self.digits = data.get(4)
-        self.counter = data.get(5)
-        self.period = data.get(6, 30 if self.otp_type == 2 else None)
+        init = object.__setattr__
+        label = data.get(1)
+        otp_type = data.get(2)  # 1 = HOTP, 2 = TOTP
+        counter = data.get(5)
+        init(self, "label", label)
+        init(self, "otp_type", otp_type)
+        init(self, "alg", data.get(3))
+        init(self, "digits", data.get(4))
+        init(self, "counter", counter)
+        init(self, "period", data.get(6, 30 if otp_type == 2 else None))
 
-    def display_parameters(self) -> str:
-        if ":" in self.label:
-            self.account, self.issuer = self.label.split(":", 1)
+        if label and ":" in label:
+            account, issuer = label.split(":", 1)
         else:
-            self.account = self.label
-            self.issuer = ""
+            account, issuer = label or "", ""
+        init(self, "account", account)
+        init(self, "issuer", issuer)
+        init(self, "counter_value", int.from_bytes(counter, 'big') if counter else None)
+        init(self, "_display_cache", {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"OTPGenerator is immutable (cannot set '{name}')")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"OTPGenerator is immutable (cannot delete '{name}')")
+
+    def __repr__(self):
+        return f"OTPGenerator(label={self.label!r}, type={TYPE_NAME.get(self.otp_type, '?')})"
+
+    def display_parameters(self) -> str:
+        language = current_language()
+        text = self._display_cache.get(language)
+        if text is None:
+            text = self._build_display_parameters()
+            self._display_cache[language] = text
+        return text
+
+    def _build_display_parameters(self) -> str:
         parts = [
             _("Type: {type_name}").format(type_name=TYPE_NAME.get(self.otp_type, '?')),
             _("Account : {account}").format(account=self.account),
@@ -33,7 +67,7 @@ class OTPGenerator:
             parts.append(_("Issuer: {issuer}").format(issuer=self.issuer))
         parts.append(_("Code length: {digits}").format(digits=self.digits))
         if self.otp_type == 1:
-            counter_value = int.from_bytes(self.counter, 'big') if self.counter else '?'
+            counter_value = self.counter_value if self.counter_value is not None else '?'
             parts.append(_("Counter: {counter}").format(counter=counter_value))
         elif self.otp_type == 2:
             parts.append(_("Timestep: {period} seconds").format(period=self.period))
@@ -0,0 +1,153 @@
+# core/otp_reference.py
+# Moteur HOTP/TOTP de référence côté hôte (RFC 4226 / RFC 6238) : calcule en lot
+# les codes de milliers de compteurs ou de fenêtres pour vérifier la sortie d'un token.
+# Les HMAC sont calculés par hashlib ; la troncature dynamique est vectorisée avec
+# NumPy s'il est installé (dépendance optionnelle), en Python pur sinon.
+#
+# python -m core.otp_reference : vecteurs des RFC et comparaison en masse avec le token émulé
+
+import hashlib
+import hmac
+import struct
+from base64 import b32encode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Codes d'algorithme COSE, comme ALG_NAME_TO_CODE de core.fido_backend
+HASHES = {4: hashlib.sha1, 5: hashlib.sha256, 7: hashlib.sha512}
+ALG_NAMES = {"SHA1": 4, "SHA256": 5, "SHA512": 7}
+
+
+def _hash_for(alg):
+    return HASHES[ALG_NAMES.get(alg, alg)] if isinstance(alg, str) else HASHES[alg]
+
+
+def _digests(secret: bytes, counters, alg) -> list:
+    """HMAC de chaque compteur (8 octets big-endian) ; la clé n'est préparée qu'une fois"""
+    base = hmac.new(secret, digestmod=_hash_for(alg))
+    digests = []
+    for counter in counters:
+        mac = base.copy()
+        mac.update(struct.pack(">Q", counter))
+        digests.append(mac.digest())
+    return digests
+
+
+def _truncate(digests, digits) -> list:
+    """Troncature dynamique (RFC 4226 §5.3) de tout le lot"""
+    modulo = 10 ** digits
+    if numpy is not None and digests:
+        table = numpy.frombuffer(b"".join(digests), dtype=numpy.uint8).reshape(len(digests), -1)
+        offsets = (table[:, -1] & 0x0F).astype(numpy.intp)
+        rows = numpy.arange(len(digests))[:, None]
+        window = table[rows, offsets[:, None] + numpy.arange(4)].astype(numpy.uint32)
+        binary = ((window[:, 0] & 0x7F) << 24) | (window[:, 1] << 16) | (window[:, 2] << 8) | window[:, 3]
+        return [str(value).zfill(digits) for value in (binary % modulo).tolist()]
+    codes = []
+    for digest in digests:
+        offset = digest[-1] & 0x0F
+        binary = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+        codes.append(str(binary % modulo).zfill(digits))
+    return codes
+
+
+def hotp_codes(secret: bytes, counters, digits: int = 6, alg=4) -> list:
+    """Codes HOTP des compteurs donnés, dans le même ordre"""
+    return _truncate(_digests(secret, counters, alg), digits)
+
+
+def totp_codes(secret: bytes, times, period: int = 30, digits: int = 6, alg=4) -> list:
+    """Codes TOTP des instants donnés (secondes Unix), T = instant // période"""
+    return hotp_codes(secret, [int(t) // period for t in times], digits, alg)
+
+
+def totp_window_codes(secret: bytes, first_window: int, count: int, digits: int = 6, alg=4) -> list:
+    """Codes des fenêtres T consécutives first_window, first_window + 1, ..."""
+    return hotp_codes(secret, range(first_window, first_window + count), digits, alg)
+
+
+# RFC 4226 annexe D : secret ASCII "12345678901234567890", compteurs 0 à 9
+RFC4226_SECRET = b"12345678901234567890"
+RFC4226_CODES = ["755224", "287082", "359152", "969429", "338314",
+                 "254676", "287922", "162583", "399871", "520489"]
+
+# RFC 6238 annexe B : 8 chiffres, période 30 s, un secret par algorithme
+RFC6238_SECRETS = {
+    4: b"12345678901234567890",
+    5: b"12345678901234567890123456789012",
+    7: b"1234567890123456789012345678901234567890123456789012345678901234",
+}
+RFC6238_CODES = {
+    59: {4: "94287082", 5: "46119246", 7: "90693936"},
+    1111111109: {4: "07081804", 5: "68084774", 7: "25091201"},
+    1111111111: {4: "14050471", 5: "67062674", 7: "99943326"},
+    1234567890: {4: "89005924", 5: "91819424", 7: "93441116"},
+    2000000000: {4: "69279037", 5: "90698825", 7: "38618901"},
+    20000000000: {4: "65353130", 5: "77737706", 7: "47863826"},
+}
+
+
+def check_rfc_vectors() -> list:
+    """Écarts avec les vecteurs de test des RFC ; liste vide si tout est conforme"""
+    failures = []
+    for counter, code in enumerate(hotp_codes(RFC4226_SECRET, range(10))):
+        if code != RFC4226_CODES[counter]:
+            failures.append(f"HOTP counter {counter}: {code} != {RFC4226_CODES[counter]}")
+    times = list(RFC6238_CODES)
+    for alg, secret in RFC6238_SECRETS.items():
+        for t, code in zip(times, totp_codes(secret, times, 30, 8, alg)):
+            if code != RFC6238_CODES[t][alg]:
+                failures.append(f"TOTP alg {alg} t={t}: {code} != {RFC6238_CODES[t][alg]}")
+    return failures
+
+
+def check_emulated_token(windows=1000) -> list:
+    """Compare en masse le token émulé au moteur : algorithmes, nombres de chiffres, périodes"""
+    import os
+    import time
+    from core.emulated_device import EmulatedOTPToken
+    from core.fido_backend import FidoOTPBackend
+
+    token = EmulatedOTPToken(capacity=50)
+    backend = FidoOTPBackend(device_sources=[token.list_devices])
+    secret = os.urandom(20)
+    seed = b32encode(secret).decode()
+    failures = []
+    now = int(time.time())
+    for algo in ALG_NAMES:
+        for digits in (6, 7, 8):
+            for period in (30, 60):
+                label = f"{algo}-{digits}-{period}"
+                if not backend.create_generator(label, "TOTP", seed, algo, digits, period=period):
+                    failures.append(f"{label}: {backend.last_error}")
+                    continue
+                first = now // period
+                expected = totp_window_codes(secret, first, windows, digits, ALG_NAMES[algo])
+                for i, code in enumerate(expected):
+                    device = backend.generate_codes([label], at_time=(first + i) * period,
+                                                    periods={label: period}).get(label)
+                    if device != code:
+                        failures.append(f"{label} T={first + i}: device {device} != {code}")
+                        break
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from core.i18n_manager import setup_i18n
+    setup_i18n()
+
+    start = time.perf_counter()
+    codes = totp_window_codes(RFC6238_SECRETS[4], 0, 100000)
+    elapsed = time.perf_counter() - start
+    print(f"engine: {'numpy' if numpy is not None else 'pure Python'}, "
+          f"{len(codes)} windows in {elapsed * 1000:.0f} ms")
+    failures = check_rfc_vectors() + check_emulated_token()
+    for failure in failures:
+        print(failure)
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
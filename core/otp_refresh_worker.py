@@ -1,57 +1,185 @@
 # core/otp_refresh_worker.py
 # thread de rafraîchissement qui protège l’UI des I/O lents.
+# Chaque refresh porte un numéro de génération et peut être annulé entre deux commandes.
 
+import threading
+import time
 from PyQt6.QtCore import QObject, pyqtSignal
 from core.otp_model import OTPGenerator
+from core.fido_backend import PRIORITY_BACKGROUND
+
+CODE_PLACEHOLDER = "• • • • • •"  # HOTP, ou TOTP pas encore généré (hors écran)
+
+
+class RefreshDelta:
+    """Différences entre les cartes affichées et le contenu du device"""
+
+    def __init__(self):
+        self.added = []     # (OTPGenerator, code) absents de l'UI
+        self.removed = []   # labels qui n'existent plus sur le device
+        self.changed = {}   # label -> nouveau code TOTP
+        self.windows = {}   # label -> fenêtre T pour laquelle le code a été généré
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
 
 class OTPRefreshWorker(QObject):
-    finished = pyqtSignal(list)
-    error = pyqtSignal(str)
-    device_status_changed = pyqtSignal(bool)  # Nouveau signal pour l'état de connexion
+    partial = pyqtSignal(int, object)   # génération, RefreshDelta : métadonnées puis chaque code
+    finished = pyqtSignal(int, object)  # génération, dernier RefreshDelta ; fin du refresh
+    error = pyqtSignal(int, str)        # génération, message
+    cancelled = pyqtSignal(int)         # génération
+    done = pyqtSignal()                 # émis dans tous les cas, à la fin de run()
 
-    def __init__(self, backend):
+    def __init__(self, backend, known_codes=None, generation=0,
+                 visible_labels=None, search_text="", new_code_budget=None, code_targets=None,
+                 priority=PRIORITY_BACKGROUND):
+        """
+        visible_labels: labels affichés à l'écran ; None = générer tous les TOTP
+        search_text: filtre de recherche courant (pour les générateurs nouveaux)
+        new_code_budget: nb max de nouveaux TOTP à générer d'emblée (≈ une page d'écran)
+        code_targets: OTPGenerator dont seul le code est à générer, sans énumération
+        priority: PRIORITY_INTERACTIVE pour le refresh d'une carte NFC tout juste posée
+        """
         super().__init__()
         self.backend = backend
+        # Instantané label -> code affiché, pris dans le thread GUI au lancement
+        self.known_codes = dict(known_codes or {})
+        self.generation = generation
+        self.visible_labels = set(visible_labels) if visible_labels is not None else None
+        self.search_text = search_text.lower()
+        self.new_code_budget = new_code_budget
+        self.code_targets = code_targets
+        self.priority = priority
+        self._cancel_event = threading.Event()
+
+    def _wants_code(self, generator) -> bool:
+        """Les TOTP cachés (recherche, défilement) sont générés à la demande plus tard"""
+        if self.visible_labels is None or generator.label in self.visible_labels:
+            return True
+        if generator.label in self.known_codes or self.search_text not in generator.label.lower():
+            return False
+        # Nouveau générateur : seulement ceux qui rempliront le premier écran
+        if self.new_code_budget is None:
+            return True
+        if self.new_code_budget > 0:
+            self.new_code_budget -= 1
+            return True
+        return False
+
+    def _stream_codes(self, generators, shown) -> RefreshDelta:
+        """Codes TOTP de tout le lot en une session device, tous de la même fenêtre.
+        Chaque code est émis (partial) dès son arrivée, dans l'ordre de generators ;
+        renvoie le delta des codes restés sans réponse, pour le signal de fin."""
+        if not generators:
+            return RefreshDelta()
+
+        # Instant fixé ici : la fenêtre de chaque code est connue même si le lot
+        # se termine après un changement de période
+        at_time = time.time()
+        windows = {g.label: int(at_time) // g.period for g in generators}
+
+        def on_result(label, code):
+            code = code or _("Error")
+            if self.is_cancelled() or shown.get(label) == code:
+                return
+            shown[label] = code
+            delta = RefreshDelta()
+            delta.changed[label] = code
+            delta.windows[label] = windows[label]
+            self.partial.emit(self.generation, delta)
+
+        codes = self.backend.generate_codes([g.label for g in generators], at_time=at_time,
+                                            periods={g.label: g.period for g in generators},
+                                            priority=self.priority, cancelled=self.is_cancelled,
+                                            on_result=on_result)
+        remaining = RefreshDelta()
+        for g in generators:
+            code = codes.get(g.label) or _("Error")
+            if shown.get(g.label) != code:
+                shown[g.label] = code
+                remaining.changed[g.label] = code
+                remaining.windows[g.label] = windows[g.label]
+        return remaining
+
+    def cancel(self):
+        """Thread-safe : le refresh s'arrête avant sa prochaine commande device"""
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
 
     def run(self):
         """Execute le refresh avec gestion de la connexion/déconnexion"""
         try:
-            all_generators = self.backend.get_all_generators()
-            
+            self._run()
+        finally:
+            self.done.emit()
+
+    def _run(self):
+        if self.code_targets is not None:
+            self._run_codes_only()
+            return
+        try:
+            # Trafic de fond par défaut : cède la place aux actions utilisateur entre deux commandes
+            all_generators = self.backend.get_all_generators(priority=self.priority,
+                                                             cancelled=self.is_cancelled)
+            if self.is_cancelled():
+                self.cancelled.emit(self.generation)
+                return
+
             if all_generators is None:
                 # Erreur de connexion
-                self.device_status_changed.emit(False)
                 error_message = getattr(self.backend, "last_error", _("Device not detected"))
-                self.error.emit(error_message)
+                self.error.emit(self.generation, error_message)
                 return
             elif all_generators is False:
                 # Erreur CTAP
-                self.device_status_changed.emit(False)
                 error_message = getattr(self.backend, "last_error", _("CTAP error"))
-                self.error.emit(error_message)
+                self.error.emit(self.generation, error_message)
                 return
 
             # Traiter chaque générateur
-            result = []
+            generators = []
             for g in all_generators:
                 try:
-                    generator = OTPGenerator(g)
-                    
-                    # Générer le code seulement pour les TOTP
-                    if generator.otp_type == 2:  # TOTP
-                        code = self.backend.generate_code(generator.label, generator.otp_type, generator.period)
-                        generator.code = code if code else _("Error")
-                    elif generator.otp_type == 1:  # HOTP
-                        generator.code = "• • • • • •"  # Code par défaut pour HOTP
-                        
-                    result.append(generator)
+                    generators.append(OTPGenerator(g))
                 except Exception as e:
                     # Si erreur sur un générateur spécifique, continuer avec les autres
                     continue
 
-            self.finished.emit(result)
+            # Métadonnées d'abord : les cartes apparaissent avant le premier OTP_GENERATE
+            wanted = [g for g in generators if g.otp_type == 2 and self._wants_code(g)]
+            delta = RefreshDelta()
+            shown = dict(self.known_codes)  # code affiché par l'UI une fois les partial appliqués
+            for generator in generators:
+                if generator.label not in self.known_codes:
+                    delta.added.append((generator, CODE_PLACEHOLDER))
+                    shown[generator.label] = CODE_PLACEHOLDER
+                # TOTP caché connu : garde son code jusqu'à ce qu'il redevienne visible
+                # HOTP existant : le code n'est jamais mis à jour automatiquement
+            seen = {generator.label for generator in generators}
+            delta.removed = [label for label in self.known_codes if label not in seen]
+            if not delta.is_empty():
+                self.partial.emit(self.generation, delta)
+
+            # Puis les codes, cartes visibles en tête
+            if self.visible_labels is not None:
+                wanted.sort(key=lambda g: g.label not in self.visible_labels)
+            remaining = self._stream_codes(wanted, shown)
+            if self.is_cancelled():
+                self.cancelled.emit(self.generation)
+                return
+            self.finished.emit(self.generation, remaining)
             
         except Exception as e:
-            self.device_status_changed.emit(False)
             error_message = getattr(self.backend, "last_error", _("Device not detected"))
-            self.error.emit(error_message)
\ No newline at end of file
+            self.error.emit(self.generation, error_message)
+
+    def _run_codes_only(self):
+        """Génération à la demande de cartes devenues visibles : pas d'énumération"""
+        remaining = self._stream_codes(self.code_targets, dict(self.known_codes))
+        if self.is_cancelled():
+            self.cancelled.emit(self.generation)
+            return
+        self.finished.emit(self.generation, remaining)
@@ -0,0 +1,122 @@
+# core/pcsc_monitor.py
+# Surveillance événementielle des lecteurs PC/SC (NFC) : un thread bloque dans
+# SCardGetStatusChange et signale aussitôt la pose ou le retrait d'une carte,
+# au lieu d'attendre le ping périodique du détecteur et un scan complet.
+# La source d'états est interchangeable : ScardStateSource (pyscard) en réel,
+# core.emulated_device.EmulatedReader pour les tests sans lecteur.
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+PNP_NOTIFICATION = "\\\\?PnP?\\Notification"  # pseudo-lecteur : ajout/retrait de lecteurs
+# Attente max par appel : borne l'arrêt si cancel() arrive juste avant l'attente
+WAIT_TIMEOUT_MS = 2000
+
+
+class ScardStateSource:
+    """États des lecteurs via SCardGetStatusChange (pyscard)"""
+
+    def __init__(self):
+        from smartcard import scard
+        self.scard = scard
+        hresult, self.context = scard.SCardEstablishContext(scard.SCARD_SCOPE_USER)
+        if hresult != scard.SCARD_S_SUCCESS:
+            raise OSError(scard.SCardGetErrorMessage(hresult))
+        self.states = {}  # lecteur -> dernier état connu
+        self.pnp_state = scard.SCARD_STATE_UNAWARE
+        self._refresh_readers()
+
+    def _refresh_readers(self):
+        hresult, readers = self.scard.SCardListReaders(self.context, [])
+        readers = readers if hresult == self.scard.SCARD_S_SUCCESS else []
+        self.states = {r: self.states.get(r, self.scard.SCARD_STATE_UNAWARE) for r in readers}
+
+    def wait_for_change(self, timeout_ms=WAIT_TIMEOUT_MS):
+        """Bloque jusqu'à un changement ; renvoie [(lecteur, carte présente)] des lecteurs modifiés.
+        None si l'attente a été annulée."""
+        scard = self.scard
+        request = [(r, s) for r, s in self.states.items()] + [(PNP_NOTIFICATION, self.pnp_state)]
+        hresult, result = scard.SCardGetStatusChange(self.context, timeout_ms, request)
+        if hresult == scard.SCARD_E_CANCELLED:
+            return None
+        if hresult == scard.SCARD_E_TIMEOUT:
+            return []
+        if hresult != scard.SCARD_S_SUCCESS:
+            raise OSError(scard.SCardGetErrorMessage(hresult))
+
+        changes = []
+        readers_changed = False
+        for reader, event_state, _atr in result:
+            state = event_state & ~scard.SCARD_STATE_CHANGED
+            if reader == PNP_NOTIFICATION:
+                readers_changed = bool(event_state & scard.SCARD_STATE_CHANGED)
+                self.pnp_state = state
+                continue
+            previous = self.states.get(reader, scard.SCARD_STATE_UNAWARE)
+            self.states[reader] = state
+            present = bool(state & scard.SCARD_STATE_PRESENT)
+            if previous == scard.SCARD_STATE_UNAWARE:
+                if present:
+                    changes.append((reader, True))  # carte déjà posée au démarrage
+            elif present != bool(previous & scard.SCARD_STATE_PRESENT):
+                changes.append((reader, present))
+        if readers_changed:
+            self._refresh_readers()
+        return changes
+
+    def devices(self, reader):
+        """Devices CTAP de ce seul lecteur (pour FidoOTPBackend.connect_from)"""
+        from fido2.pcsc import CtapPcscDevice
+        return list(CtapPcscDevice.list_devices(reader))
+
+    def cancel(self):
+        self.scard.SCardCancel(self.context)
+
+    def close(self):
+        self.scard.SCardReleaseContext(self.context)
+
+
+class PcscMonitor(QObject):
+    """Boucle bloquante sur les états des lecteurs, dans son propre QThread"""
+    card_inserted = pyqtSignal(str)  # nom du lecteur
+    card_removed = pyqtSignal(str)
+
+    def __init__(self, source=None):
+        super().__init__()
+        self.source = source
+        self._stopped = False
+
+    @pyqtSlot()
+    def run(self):
+        if self.source is None:
+            try:
+                self.source = ScardStateSource()
+            except Exception:
+                return  # pas de pyscard ni de service PC/SC : le ping du détecteur suffit
+        try:
+            while not self._stopped:
+                changes = self.source.wait_for_change()
+                if changes is None:
+                    return
+                for reader, present in changes:
+                    if present:
+                        self.card_inserted.emit(reader)
+                    else:
+                        self.card_removed.emit(reader)
+        except Exception:
+            return  # service PC/SC arrêté : retour au seul ping du détecteur
+        finally:
+            close = getattr(self.source, "close", None)
+            if close:
+                close()
+
+    def devices(self, reader):
+        return self.source.devices(reader)
+
+    def stop(self):
+        """Thread-safe : débloque l'attente en cours"""
+        self._stopped = True
+        if self.source is not None:
+            try:
+                self.source.cancel()
+            except Exception:
+                pass
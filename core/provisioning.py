@@ -0,0 +1,237 @@
+# core/provisioning.py
+# Poste de provisionnement (service IT, usine) : enrôle le même lot de générateurs
+# sur tous les tokens branchés, un thread et une session FidoOTPBackend par token,
+# puis relit chaque token par énumération et produit un rapport par token.
+# Les TOTP sont aussi comparés au calcul de référence dès l'enrôlement (verify=True).
+#
+# Manifeste JSON : une liste de générateurs, ou {"generators": [...]} :
+#   {"label": "compte:service", "type": "TOTP", "algo": "SHA1", "digits": 6,
+#    "period": 30, "seed": "JBSWY3DPEHPK3PXP"}
+#   (HOTP : "counter" à la place de "period")
+
+import json
+import threading
+import time
+from base64 import b32decode
+
+from core.fido_backend import (FidoOTPBackend, ALG_NAME_TO_CODE, TYPE_NAME_TO_CODE,
+                               hid_devices, pcsc_devices)
+
+STATUS_OK = "ok"                    # tous les générateurs présents et conformes
+STATUS_PARTIAL = "partial"          # au moins un générateur en échec
+STATUS_FAILED = "failed"            # token injoignable en cours de route
+STATUS_UNSUPPORTED = "unsupported"  # device FIDO sans applet OTP : ignoré
+
+
+def load_manifest(path) -> list:
+    """Lit et valide le manifeste ; ValueError au premier générateur invalide"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("generators") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(_("The manifest contains no generator"))
+
+    generators = []
+    labels = set()
+    for index, entry in enumerate(entries, 1):
+        try:
+            generators.append(_parse_entry(entry))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(_("Manifest entry {index}: {error}").format(index=index, error=e))
+        label = generators[-1]["label"]
+        if label in labels:
+            raise ValueError(_("Manifest entry {index}: duplicate label '{label}'").format(
+                index=index, label=label))
+        labels.add(label)
+    return generators
+
+
+def _parse_entry(entry) -> dict:
+    label = str(entry["label"]).strip()
+    if not label:
+        raise ValueError(_("Account name is required"))
+    otp_type = str(entry.get("type", "TOTP")).upper()
+    algo = str(entry.get("algo", "SHA1")).upper()
+    if otp_type not in TYPE_NAME_TO_CODE:
+        raise ValueError(_("Unknown type: {type}").format(type=otp_type))
+    if algo not in ALG_NAME_TO_CODE:
+        raise ValueError(_("Unknown algorithm: {algo}").format(algo=algo))
+    seed = str(entry["seed"]).replace(" ", "").upper().rstrip("=")
+    seed += "=" * (-len(seed) % 8)  # create_generator attend un Base32 complet
+    b32decode(seed)  # binascii.Error est une ValueError
+    generator = {
+        "label": label,
+        "type": otp_type,
+        "algo": algo,
+        "digits": int(entry.get("digits", 6)),
+        "seed": seed,
+        "period": None,
+        "counter": None,
+    }
+    if otp_type == "TOTP":
+        generator["period"] = int(entry.get("period", 30))
+    else:
+        generator["counter"] = int(entry.get("counter", 0))
+    return generator
+
+
+def token_name(dev, index) -> str:
+    """Nom lisible d'un device pour le rapport"""
+    descriptor = getattr(dev, "descriptor", None)
+    if descriptor is not None:
+        name = descriptor.product_name or "HID"
+        serial = descriptor.serial_number or descriptor.path
+        return f"{name} ({serial})"
+    name = getattr(dev, "_name", None)  # CtapPcscDevice : nom du lecteur
+    return str(name) if name else _("Token {index}").format(index=index)
+
+
+def discover_tokens(device_sources=None) -> list:
+    """Tous les devices branchés : [(nom, source de devices limitée à ce seul device)]"""
+    tokens = []
+    for list_devices in device_sources or [hid_devices, pcsc_devices]:
+        try:
+            devs = list(list_devices())
+        except Exception:
+            continue  # pas de service PC/SC, pas d'accès HID...
+        for dev in devs:
+            tokens.append((token_name(dev, len(tokens) + 1), lambda dev=dev: [dev]))
+    return tokens
+
+
+class TokenReport:
+    """Résultat du provisionnement d'un token"""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = None
+        self.created = []   # labels enrôlés et vérifiés
+        self.skipped = []   # labels déjà présents (sans --replace)
+        self.errors = {}    # label -> message
+        self.error = None   # erreur globale (connexion)
+        self.duration = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "token": self.name,
+            "status": self.status,
+            "created": self.created,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "error": self.error,
+            "duration_s": round(self.duration, 3),
+        }
+
+
+class TokenProvisioner:
+    """Enrôle le manifeste sur un seul token, dans son propre thread"""
+
+    def __init__(self, name, list_devices, generators, replace=False, on_progress=None):
+        self.report = TokenReport(name)
+        self.backend = FidoOTPBackend(device_sources=[list_devices])
+        self.generators = generators
+        self.replace = replace
+        self.on_progress = on_progress
+
+    def _progress(self, message):
+        if self.on_progress:
+            self.on_progress(self.report.name, message)
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            self._run()
+        finally:
+            self.report.duration = time.monotonic() - start
+            self.backend.invalidate_connection()
+
+    def _run(self):
+        report = self.report
+        existing = self.backend.get_all_generators()
+        if existing is None:
+            report.error = self.backend.last_error or _("Device not detected")
+            # Seul un refus CTAP explicite de la sonde OTP désigne un device sans applet OTP ;
+            # un délai dépassé ou une erreur d'E/S est une panne du token (STATUS_FAILED)
+            unsupported = self.backend.last_error_kind == "unsupported"
+            report.status = STATUS_UNSUPPORTED if unsupported else STATUS_FAILED
+            return
+        present = {g.get(1) for g in existing}
+
+        pending = []
+        for generator in self.generators:
+            label = generator["label"]
+            if label in present:
+                if not self.replace:
+                    report.skipped.append(label)
+                    continue
+                if not self.backend.delete_generator(label):
+                    report.errors[label] = self.backend.last_error or _("Unknown error")
+                    continue
+            if self.backend.create_generator(label, generator["type"], generator["seed"],
+                                             generator["algo"], generator["digits"],
+                                             counter=generator["counter"], period=generator["period"],
+                                             verify=True):
+                pending.append(generator)
+                self._progress(_("'{label}' enrolled").format(label=label))
+            else:
+                report.errors[label] = self.backend.last_error or _("Unknown error")
+                if self.backend.last_error_kind not in ("ctap", "verify"):
+                    break  # token retiré ou muet : inutile d'insister
+
+        self._verify(pending)
+        if report.error:
+            report.status = STATUS_FAILED
+        else:
+            report.status = STATUS_PARTIAL if report.errors else STATUS_OK
+
+    def _verify(self, pending):
+        """Relit le token : chaque générateur enrôlé doit être présent avec ses paramètres"""
+        if not pending:
+            return
+        listed = self.backend.get_all_generators()
+        if listed is None:
+            self.report.error = self.backend.last_error or _("Device not detected")
+            for generator in pending:
+                self.report.errors[generator["label"]] = _("Not verified")
+            return
+        found = {g.get(1): g for g in listed}
+        for generator in pending:
+            label = generator["label"]
+            entry = found.get(label)
+            if entry is None:
+                self.report.errors[label] = _("Missing after enrollment")
+            elif (entry.get(2) != TYPE_NAME_TO_CODE[generator["type"]]
+                  or entry.get(3) != ALG_NAME_TO_CODE[generator["algo"]]
+                  or entry.get(4) != generator["digits"]
+                  or (generator["period"] is not None and entry.get(6, 30) != generator["period"])):
+                self.report.errors[label] = _("Parameters differ after enrollment")
+            else:
+                self.report.created.append(label)
+
+
+def provision_all(generators, device_sources=None, replace=False, on_progress=None) -> list:
+    """Enrôle le manifeste sur tous les tokens en parallèle ; renvoie un TokenReport par device"""
+    provisioners = [TokenProvisioner(name, list_devices, generators, replace, on_progress)
+                    for name, list_devices in discover_tokens(device_sources)]
+    threads = [threading.Thread(target=p.run, name=f"provision-{index}", daemon=True)
+               for index, p in enumerate(provisioners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [p.report for p in provisioners]
+
+
+def format_report(reports) -> str:
+    lines = [f"{'token':<40}{'status':<13}{'created':>8}{'skipped':>8}{'errors':>8}{'s':>8}"]
+    for r in reports:
+        lines.append(f"{r.name[:39]:<40}{r.status:<13}{len(r.created):>8}{len(r.skipped):>8}"
+                     f"{len(r.errors):>8}{r.duration:>8.2f}")
+        if r.error:
+            lines.append(f"    {r.error}")
+        for label, message in r.errors.items():
+            lines.append(f"    {label}: {message}")
+    provisioned = sum(1 for r in reports if r.status == STATUS_OK)
+    tokens = sum(1 for r in reports if r.status != STATUS_UNSUPPORTED)
+    lines.append(_("{ok}/{total} tokens provisioned").format(ok=provisioned, total=tokens))
+    return "\n".join(lines)
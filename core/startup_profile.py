@@ -0,0 +1,117 @@
+# core/startup_profile.py
+# Mode --profile-startup : temps de chaque phase du démarrage (imports, i18n, QSS,
+# construction de la fenêtre, première réponse du device) et de chaque module
+# importé, affichés à la fin du démarrage.
+# NEOOTP_STARTUP_BUDGET_MS=800 fait échouer le lancement (code 1) au-delà du budget.
+
+import sys
+import threading
+import time
+
+
+class _TimedLoader:
+    """Enveloppe le loader d'un module le temps de son exec_module"""
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Le module garde son vrai loader (reload, importlib.resources...)
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.leave(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer:
+    """Finder placé en tête de sys.meta_path : mesure le temps propre et cumulé de chaque import"""
+
+    def __init__(self):
+        self.modules = {}  # nom -> (temps propre, temps cumulé, thread)
+        self._local = threading.local()
+
+    def find_spec(self, name, path=None, target=None):
+        if getattr(self._local, "searching", False):
+            return None
+        self._local.searching = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.searching = False
+
+    def enter(self):
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append([time.perf_counter(), 0.0])  # début, temps des imports imbriqués
+
+    def leave(self, name):
+        start, nested = self._local.stack.pop()
+        total = time.perf_counter() - start
+        if self._local.stack:
+            self._local.stack[-1][1] += total
+        self.modules[name] = (total - nested, total, threading.current_thread().name)
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []  # (phase, instant de fin)
+        self.imports = ImportTimer()
+        self.imports.install()
+
+    def mark(self, phase):
+        """Termine la phase en cours (débutée à la marque précédente)"""
+        self.marks.append((phase, time.perf_counter()))
+
+    def total_ms(self) -> float:
+        end = self.marks[-1][1] if self.marks else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def report(self, top=20) -> str:
+        lines = [f"{'phase':<40}{'ms':>10}{'cumul ms':>12}"]
+        previous = self.start
+        for phase, instant in self.marks:
+            lines.append(f"{phase:<40}{(instant - previous) * 1000:>10.1f}{(instant - self.start) * 1000:>12.1f}")
+            previous = instant
+        lines.append("")
+        lines.append(f"{'import (top ' + str(top) + ' self time)':<40}{'self ms':>10}{'cumul ms':>12}  thread")
+        slowest = sorted(self.imports.modules.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (own, total, thread) in slowest[:top]:
+            lines.append(f"{name:<40}{own * 1000:>10.1f}{total * 1000:>12.1f}  {thread}")
+        lines.append(f"{len(self.imports.modules)} modules imported")
+        return "\n".join(lines)
+
+    def finish(self, budget_ms=None) -> int:
+        """Affiche le rapport ; code de sortie 1 si le budget de démarrage est dépassé"""
+        self.imports.uninstall()
+        print(self.report())
+        total = self.total_ms()
+        if budget_ms and total > budget_ms:
+            print(f"Startup took {total:.0f} ms, over the {budget_ms:.0f} ms budget")
+            return 1
+        return 0
@@ -1,11 +1,24 @@
+import sys
+# --profile-startup : le profileur doit précéder tous les autres imports
+profiler = None
+if "--profile-startup" in sys.argv and __name__ == "__main__":
+    from core.startup_profile import StartupProfiler
+    profiler = StartupProfiler()
+
+def mark(phase):
+    if profiler:
+        profiler.mark(phase)
+
 from PyQt6.QtWidgets import QApplication, QMessageBox
-from PyQt6.QtCore import QSharedMemory, QSystemSemaphore
-import sys, re, os
+from PyQt6.QtCore import QSharedMemory, QSystemSemaphore, QTimer
+import re, os
+import multiprocessing
 import tempfile
 import atexit
+mark("imports (Qt, stdlib)")
 from core.i18n_manager import setup_i18n
 setup_i18n()
-from ui.main_window import MainWindow
+mark("i18n")
 from ui.ressources import resource_path
 
 
@@ -242,19 +255,124 @@ if hasattr(sys, 'frozen'):
     # Mode exécutable
     os.environ['QT_AUTO_SCREEN_SCALE_FACTOR'] = '1'
     
+def run_daemon(socket_path=None):
+    """Mode service : sert les codes via un socket Unix, sans interface"""
+    from core.otp_daemon import OTPDaemon
+    daemon = OTPDaemon(socket_path)
+    print(f"NeoOTP service listening on {daemon.socket_path}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e)
+        return 1
+    return 0
+
+def run_provisioning(manifest_path, replace=False, report_path=None):
+    """Mode poste de provisionnement : enrôle le manifeste sur tous les tokens branchés"""
+    import json
+    from core.provisioning import load_manifest, provision_all, format_report, STATUS_OK, STATUS_UNSUPPORTED
+    try:
+        generators = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(e)
+        return 2
+    reports = provision_all(generators, replace=replace,
+                            on_progress=lambda token, message: print(f"[{token}] {message}"))
+    print(format_report(reports))
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump([r.as_dict() for r in reports], f, indent=2, ensure_ascii=False)
+    tokens = [r for r in reports if r.status != STATUS_UNSUPPORTED]
+    return 0 if tokens and all(r.status == STATUS_OK for r in tokens) else 1
+
+def option_value(name):
+    """Valeur qui suit l'option name dans la ligne de commande, ou None"""
+    if name not in sys.argv:
+        return None
+    index = sys.argv.index(name)
+    value = sys.argv[index + 1] if index + 1 < len(sys.argv) else None
+    return None if value is None or value.startswith("--") else value
+
 def main():    
+    if "--daemon" in sys.argv:
+        index = sys.argv.index("--daemon")
+        socket_path = sys.argv[index + 1] if index + 1 < len(sys.argv) else None
+        if socket_path and socket_path.startswith("--"):
+            socket_path = None
+        return run_daemon(socket_path)
+
+    if "--provision" in sys.argv:
+        manifest_path = option_value("--provision")
+        if manifest_path is None:
+            print("usage: main.py --provision manifest.json [--replace] [--report report.json]")
+            return 2
+        return run_provisioning(manifest_path, "--replace" in sys.argv, option_value("--report"))
+
+    if "--palette" in sys.argv:
+        # Raccourci global : réveille la palette de l'instance résidente si elle existe
+        from ui.tray import summon_resident_palette
+        if summon_resident_palette():
+            return 0
+    tray_mode = "--tray" in sys.argv or "--palette" in sys.argv
 
     singleton = FileLockSingleton("NeoOTP")
 
+    if "--device-process" in sys.argv or os.environ.get("NEOOTP_DEVICE_PROCESS") == "1":
+        # Trafic CTAP isolé dans un processus enfant supervisé
+        from core.device_process import DeviceProcessBackend
+        backend = DeviceProcessBackend()
+    else:
+        from core.fido_backend import FidoOTPBackend
+        backend = FidoOTPBackend()
+    # Découverte HID/PC/SC et première énumération pendant la construction de l'interface
+    backend.start_prefetch()
+    mark("backend + prefetch start")
+
+    from ui.main_window import MainWindow
+    mark("import ui.main_window")
     app = QApplication(sys.argv)    
+    mark("QApplication")
     styles = load_qss_with_images()
     if styles:
         app.setStyleSheet(styles)
-    window = MainWindow()    
-    window.show()    
+    mark("stylesheet")
+
+    window = MainWindow(backend)    
+    mark("window build")
+    if tray_mode:
+        from ui.tray import TrayController
+        tray = TrayController(window, app)
+        if "--palette" in sys.argv:
+            # Première instance : la palette se remplit à l'arrivée de l'énumération
+            tray.show_palette()
+    else:
+        window.show()    
+    mark("window shown")
+
+    if profiler:
+        # Rapport à l'arrivée du premier refresh (codes affichés ou erreur device)
+        exit_code = []
+        def wait_first_response():
+            if window.pending_refresh:
+                return
+            poll.stop()
+            mark("first device response")
+            budget = float(os.environ.get("NEOOTP_STARTUP_BUDGET_MS", "0"))
+            exit_code.append(profiler.finish(budget))
+            window.tray_mode = False
+            window.close()
+            app.quit()
+        poll = QTimer()
+        poll.timeout.connect(wait_first_response)
+        poll.start(5)
+        app.exec()
+        return exit_code[0] if exit_code else 1
 
     # Plus besoin du try/finally car atexit s'en occupe
     return app.exec()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker device en mode exécutable
     sys.exit(main())  # sys.exit() seulement ici
\ No newline at end of file
@@ -0,0 +1,173 @@
+# tools/soak.py
+# Test d'endurance headless : enchaîne des milliers de refresh, débranchements
+# et enrôlements/suppressions sur un token émulé, et échoue si le nombre de
+# QObject, le tas Python, la RSS ou le nombre de threads augmentent dans la durée.
+#
+# Lancement : QT_QPA_PLATFORM=offscreen python tools/soak.py --cycles 3000
+
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from core.i18n_manager import setup_i18n
+setup_i18n()
+
+from PyQt6.QtCore import QObject, QCoreApplication, QEventLoop, QMetaObject, Qt
+from PyQt6.QtWidgets import QApplication
+from PyQt6 import sip
+
+from core.emulated_device import EmulatedOTPToken
+from core.fido_backend import FidoOTPBackend
+from ui.main_window import MainWindow
+
+SEED = "JBSWY3DPEHPK3PXPJBSWY3DPEHPK3PXP"
+
+# Tolérance de croissance entre le début (après chauffe) et la fin du run
+TOLERANCES = {
+    "qobjects": (0.05, 20),     # relatif, absolu
+    "heap_kb": (0.10, 512),
+    "rss_kb": (0.15, 8192),
+    "threads": (0.0, 2),
+}
+
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # pic, faute de mieux
+
+
+def native_thread_count() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def live_qobjects() -> int:
+    gc.collect()
+    return sum(1 for o in gc.get_objects() if isinstance(o, QObject) and not sip.isdeleted(o))
+
+
+def sample() -> dict:
+    return {
+        "qobjects": live_qobjects(),
+        "heap_kb": tracemalloc.get_traced_memory()[0] // 1024,
+        "rss_kb": rss_kb(),
+        "threads": native_thread_count(),
+    }
+
+
+def process_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        QCoreApplication.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 20)
+    # Laisser passer les deleteLater et signaux en file
+    QCoreApplication.sendPostedEvents(None, 0)
+    QCoreApplication.processEvents()
+
+
+def populate(token, count):
+    backend = FidoOTPBackend(device_sources=[token.list_devices])
+    for i in range(count):
+        otp_type = "TOTP" if i % 4 else "HOTP"
+        backend.create_generator(f"account{i}:issuer{i % 7}", otp_type, SEED, "SHA1",
+                                 counter=0 if otp_type == "HOTP" else None,
+                                 period=30 if otp_type == "TOTP" else None)
+
+
+def trend_failures(samples):
+    """Compare la médiane du 2e quart (après chauffe) à celle du dernier quart"""
+    failures = []
+    quarter = max(len(samples) // 4, 1)
+    for metric, (relative, absolute) in TOLERANCES.items():
+        start = sorted(s[metric] for s in samples[quarter:2 * quarter])
+        end = sorted(s[metric] for s in samples[-quarter:])
+        start_median = start[len(start) // 2]
+        end_median = end[len(end) // 2]
+        limit = start_median * (1 + relative) + absolute
+        if end_median > limit:
+            failures.append(f"{metric}: {start_median} -> {end_median} (limit {limit:.0f})")
+    return failures
+
+
+def run(cycles, sample_every, generators, plug_every, mutate_every):
+    app = QApplication.instance() or QApplication(sys.argv)
+    tracemalloc.start()
+
+    token = EmulatedOTPToken()
+    populate(token, generators)
+    backend = FidoOTPBackend(device_sources=[token.list_devices])
+    window = MainWindow(backend)
+    # Les débranchements sont pilotés par le harnais, pas par le détecteur
+    QMetaObject.invokeMethod(window.detector, "stop", Qt.ConnectionType.QueuedConnection)
+    window.show()
+
+    samples = []
+    for cycle in range(1, cycles + 1):
+        if plug_every and cycle % plug_every == 0:
+            token.unplug()
+            window._handle_detection_result(False)
+            window.start_refresh_thread()
+            process_until(lambda: not window.pending_refresh)
+            token.plug()
+            backend.reset_backoff()  # évènement de branchement : referme le disjoncteur
+            window._handle_detection_result(True)
+
+        if mutate_every and cycle % mutate_every == 0:
+            label = f"soak{cycle}"
+            backend.create_generator(label, "TOTP", SEED, "SHA1", period=30)
+            window.on_enroll_success()
+            process_until(lambda: label in window.generator_widgets)
+            window._complete_delete_operation(label)
+            process_until(lambda: not window.operation_in_progress)
+
+        window.start_refresh_thread()
+        process_until(lambda: not window.pending_refresh)
+
+        if cycle % sample_every == 0:
+            samples.append(sample())
+            s = samples[-1]
+            print(f"cycle {cycle:6d}  qobjects={s['qobjects']:6d}  heap={s['heap_kb']:8d} KB  "
+                  f"rss={s['rss_kb']:8d} KB  threads={s['threads']:3d}  device_cmds={token.command_count}")
+
+    window.close()
+    process_until(lambda: True)
+
+    if len(samples) < 8:
+        print("Not enough samples to detect a trend (increase --cycles)")
+        return 0
+    failures = trend_failures(samples)
+    for failure in failures:
+        print(f"LEAK {failure}")
+    print("FAIL" if failures else "OK")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of the refresh pipeline on an emulated token")
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--generators", type=int, default=40)
+    parser.add_argument("--plug-every", type=int, default=25, help="unplug/replug every N cycles (0 = never)")
+    parser.add_argument("--mutate-every", type=int, default=10, help="enroll+delete every N cycles (0 = never)")
+    args = parser.parse_args()
+    return run(args.cycles, args.sample_every, args.generators, args.plug_every, args.mutate_every)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ from PyQt6.QtGui import QIcon
 from ui.header import Header
 from PyQt6.QtGui import QValidator, QIcon
 from ui.ressources import resource_path
+from core.device_task import run_device_task
 
 SEED_LENGTH_LIMITS = {
     "SHA1": {"min_recommended": 20, "min_accepted": 1, "max": 64},
@@ -22,6 +23,7 @@ class EnrollWidget(QWidget):
     def __init__(self, backend, parent=None):
         super().__init__(parent)
         self.backend = backend
+        self._enrolling = False  # create_generator (et sa vérification) en cours sur le device
         self.setWindowTitle(_("Enroll OTP secret"))
         self.setMinimumWidth(400)
 
@@ -274,8 +276,8 @@ class EnrollWidget(QWidget):
                 is_valid = False
                 tooltip_msg = _("Invalid Base32 encoding: {error}").format(error=str(e))
                 
-        # Activer/désactiver le bouton selon la validation
-        self.enroll_btn.setEnabled(is_valid)
+        # Activer/désactiver le bouton selon la validation ; jamais pendant un enrôlement
+        self.enroll_btn.setEnabled(is_valid and not self._enrolling)
         self.enroll_btn.setToolTip(tooltip_msg if not is_valid else "")
 
     def _toggle_parameters_visibility(self):
@@ -369,6 +371,8 @@ class EnrollWidget(QWidget):
         return True, ""
 
     def _enroll(self):
+        if self._enrolling:
+            return
         account_name = self.account_edit.text().strip()
         issuer_name = self.issuer_edit.text().strip()
         label = f"{account_name}:{issuer_name}" if issuer_name else account_name
@@ -404,16 +408,31 @@ class EnrollWidget(QWidget):
             self.seed_edit.setStyleSheet("background-color: #ffe4e1;")
             return
 
-        success = self.backend.create_generator(
+        # Écriture sur le device hors du thread GUI
+        self._enrolling = True
+        self.enroll_btn.setEnabled(False)
+        run_device_task(
+            self.backend.create_generator,
             label=label,
             otp_type=otp_type,
             secret_b32=seed,
             algo=algo,
             digits=digits,
             counter=param if otp_type == "HOTP" else None,
-            period=param if otp_type == "TOTP" else None
+            period=param if otp_type == "TOTP" else None,
+            verify=True,  # TOTP relu et comparé au calcul hôte avant d'oublier la graine
+            on_finished=self._on_enroll_finished,
+            on_failed=self._on_enroll_failed
         )
 
+    def _on_enroll_failed(self, _context, error):
+        self._enrolling = False
+        self._validate_form()
+        QMessageBox.critical(self, _("OTP Error"), error)
+
+    def _on_enroll_finished(self, success):
+        self._enrolling = False
+        self._validate_form()
         if success:
             self.seed_enrolled.emit()
 
@@ -1,22 +1,32 @@
 # ui/main_window.py
 from PyQt6.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QHBoxLayout,
-    QScrollArea, QPushButton, QMessageBox, QStackedLayout, QLineEdit, QGraphicsOpacityEffect
+    QScrollArea, QPushButton, QMessageBox, QStackedLayout, QLineEdit, QGraphicsOpacityEffect,
+    QWIDGETSIZE_MAX
 )
 from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt, QTimer, QSize, QThread, QMetaObject, QMutex, QPropertyAnimation, QEasingCurve
+from PyQt6.QtCore import Qt, QTimer, QSize, QThread, QMetaObject, QPropertyAnimation, QEasingCurve, QPoint, QRect, pyqtSignal
 from ui.otp_card import OTPCard
-from ui.enroll_widget import EnrollWidget
-from core.fido_backend import FidoOTPBackend
-from core.otp_refresh_worker import OTPRefreshWorker
+from core.fido_backend import FidoOTPBackend, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from core.otp_refresh_worker import OTPRefreshWorker, CODE_PLACEHOLDER
+from core.otp_model import OTPGenerator
 from core.detection_worker import DetectorWorker
+from core.pcsc_monitor import PcscMonitor
+from core.device_task import run_device_task
 from ui.header import Header
 from ui.ressources import resource_path
 
 import time
 
+CARD_MIN_HEIGHT = 60  # estimation basse de la hauteur d'une carte, pour le premier écran
+PROGRESS_TICK_MS = 50  # horloge commune des barres TOTP (≈ 1 pixel de barre par tick)
+CARD_POOL_SIZE = 200  # cartes détachées gardées pour être réassociées (capacité d'un token)
+
 class MainWindow(QWidget):
-    def __init__(self):
+    generators_changed = pyqtSignal()  # cartes ajoutées ou supprimées
+
+    def __init__(self, backend=None, card_source=None):
+        """card_source: source d'états de lecteurs PC/SC (None = pyscard si disponible)"""
         super().__init__()
         self.setWindowTitle("NEOWAVE OTP Manager - V0.0.7")
         logo_path = resource_path("images", "logo.png")
@@ -30,11 +40,15 @@ class MainWindow(QWidget):
         # self.setWindowFlags(flags | Qt.WindowType.MSWindowsFixedSizeDialogHint)
         #self.setWindowFlags(self.windowFlags() & ~Qt.WindowType.WindowMaximizeButtonHint)
 
-        self.backend = FidoOTPBackend()
+        # FidoOTPBackend, ou DeviceProcessBackend en mode processus séparé
+        self.backend = backend or FidoOTPBackend()
         self.generator_widgets = {}
+        self.card_pool = []  # OTPCard détachées, prêtes à être réassociées (cf. _acquire_card)
+        self.tray_mode = False  # mode résident : fermer = cacher (cf. ui/tray.py)
 
-        self.refresh_mutex = QMutex()
-        self.current_refresh_thread = None
+        # Refresh en cours : génération -> (QThread, OTPRefreshWorker)
+        self.refresh_generation = 0
+        self.refresh_jobs = {}
 
         # Pour une interface à onglets
         self.stack = QStackedLayout()
@@ -92,22 +106,30 @@ class MainWindow(QWidget):
         self.otp_list_layout.setSpacing(10) # espacement entre les cartes 
         scroll_area.setWidget(self.otp_list_widget)
         main_view_layout.addWidget(scroll_area, stretch=1)
+        self.scroll_area = scroll_area
+        scroll_area.verticalScrollBar().valueChanged.connect(self.schedule_visibility_check)
+        self.search_bar = search_bar
 
         # === Vue d'enrôlement ===
-        self.enroll_widget = EnrollWidget(self.backend, self)
-        self.enroll_widget.seed_enrolled.connect(self.on_enroll_success)
-        self.enroll_widget.cancel_requested.connect(self.switch_to_main_view)
-        self.stack.addWidget(self.enroll_widget)
+        self.enroll_widget = None  # construite à la première ouverture
 
         self.last_totp_cycles = {}  # label -> dernier cycle vu
-        self.pending_refresh = False  # Flag pour éviter les refresh multiples
+        self.code_cycles = {}  # label -> cycle TOTP du code affiché (ou tenté)
+        self.rollover_missed = False  # changement de période survenu pendant un refresh
+
+        # Génération paresseuse des codes devenus visibles (défilement, recherche)
+        self.visibility_timer = QTimer(self)
+        self.visibility_timer.setSingleShot(True)
+        self.visibility_timer.setInterval(100)
+        self.visibility_timer.timeout.connect(self.fill_visible_codes)
         self.operation_in_progress = False  # Flag pour les opérations utilisateur
-        self.operation_timer = None  # Timer pour les opérations en attente
+        self.operation_generation = None  # Refresh dont l'arrivée termine l'opération
 
-        # Timer pour les barres de progression TOTP
+        # Horloge unique des barres de progression TOTP : seules les barres
+        # visibles dont le remplissage change se redessinent
         self.progress_timer = QTimer(self)
         self.progress_timer.timeout.connect(self.update_progress_bars)
-        self.progress_timer.start(20)
+        self.progress_timer.start(PROGRESS_TICK_MS)
 
         # Timer séparé pour forcer les refresh périodiques (backup)
         self.backup_refresh_timer = QTimer(self)
@@ -118,21 +140,37 @@ class MainWindow(QWidget):
         self.start_refresh_thread()
 
         #Detection des devices
-        self.setup_detection_thread()
+        self.setup_detection_thread(card_source)
+
+    def setup_detection_thread(self, card_source=None):
+        # Pose/retrait de carte NFC signalés sans attendre le ping (pas en mode processus séparé)
+        self.pcsc_monitor = None
+        self.pcsc_thread = None
+        if hasattr(self.backend, "connect_from"):
+            self.pcsc_monitor = PcscMonitor(card_source)
+            self.pcsc_thread = QThread()
+            self.pcsc_monitor.moveToThread(self.pcsc_thread)
+            self.pcsc_thread.started.connect(self.pcsc_monitor.run)
 
-    def setup_detection_thread(self):
         self.detection_thread = QThread()
-        self.detector = DetectorWorker(self.backend)
+        self.detector = DetectorWorker(self.backend, pcsc_monitor=self.pcsc_monitor)
         self.detector.moveToThread(self.detection_thread)
 
         self.detection_thread.started.connect(self.detector.start)
         self.detector.device_status.connect(self._handle_detection_result)
+        self.detector.card_connected.connect(self._on_card_connected)
 
         self.detection_thread.start()
+        if self.pcsc_thread is not None:
+            self.pcsc_thread.start()
+
+    def _on_card_connected(self):
+        # Carte posée : un seul refresh, prioritaire, tant qu'elle est sur le lecteur
+        self._handle_detection_result(True, PRIORITY_INTERACTIVE)
         
-    def _handle_detection_result(self, connected: bool):
+    def _handle_detection_result(self, connected: bool, priority=PRIORITY_BACKGROUND):
         if connected:
-            self.start_refresh_thread()
+            self.start_refresh_thread(priority=priority)
             self.status_label.hide()
             self.set_cards_online()
         else:
@@ -141,6 +179,7 @@ class MainWindow(QWidget):
             self.set_cards_offline(_("Device disconnected"))
 
     def set_cards_offline(self, reason: str):
+        self.code_cycles.clear()  # codes effacés : à regénérer au retour du device
         for card in self.generator_widgets.values():
             card.set_offline(reason)
 
@@ -173,14 +212,61 @@ class MainWindow(QWidget):
                     needs_refresh = True
         
         # Déclencher refresh si nouveau cycle détecté
-        if needs_refresh and not self.pending_refresh:
-            self.start_refresh_thread()
+        if needs_refresh:
+            if self.pending_refresh:
+                self.rollover_missed = True  # relancé à la fin du refresh en cours
+            else:
+                self.start_refresh_thread()
         
     def on_search_text_changed(self, text):
         for label, card in self.generator_widgets.items():
             card.setVisible(text.lower() in label.lower())
+        self.schedule_visibility_check()
+
+    def visible_labels(self) -> set:
+        """Labels des cartes non filtrées et au moins partiellement dans la zone visible"""
+        viewport = self.scroll_area.viewport()
+        area = viewport.rect()
+        labels = set()
+        for label, card in self.generator_widgets.items():
+            if card.isHidden():
+                continue
+            top_left = card.mapTo(viewport, QPoint(0, 0))
+            if QRect(top_left, card.size()).intersects(area):
+                labels.add(label)
+        return labels
+
+    def schedule_visibility_check(self, *args):
+        self.visibility_timer.start()  # regroupe les évènements de défilement rapprochés
+
+    def fill_visible_codes(self):
+        """Génère à la demande les codes TOTP visibles qui ne sont pas de la fenêtre courante"""
+        if self.pending_refresh:
+            return  # le refresh en cours relancera la vérification à son arrivée
+        now = time.time()
+        targets = []
+        for label in self.visible_labels():
+            card = self.generator_widgets[label]
+            if card.otp_type != 2 or card.property("offline"):
+                continue
+            cycle = int(now // card.period)
+            if self.code_cycles.get(label) != cycle:
+                self.code_cycles[label] = cycle  # tentative unique par cycle
+                targets.append(card.generator)
+        if targets:
+            self.start_refresh_thread(code_targets=targets)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_visibility_check()
 
     def switch_to_enroll_view(self):
+        if self.enroll_widget is None:
+            from ui.enroll_widget import EnrollWidget
+            self.enroll_widget = EnrollWidget(self.backend, self)
+            self.enroll_widget.seed_enrolled.connect(self.on_enroll_success)
+            self.enroll_widget.cancel_requested.connect(self.switch_to_main_view)
+            self.stack.addWidget(self.enroll_widget)
         self.stack.setCurrentWidget(self.enroll_widget)
 
     def switch_to_main_view(self):
@@ -188,40 +274,21 @@ class MainWindow(QWidget):
 
     def on_enroll_success(self):
         """Appelé après un enrôlement réussi"""
+        self.switch_to_main_view()
+        self._start_operation_refresh()
+
+    def _start_operation_refresh(self):
+        """Relance la liste après une mutation ; l'UI est libérée dès que ce refresh aboutit.
+        Un refresh plus ancien encore en cours est annulé, la mutation ne l'attend jamais."""
         self.operation_in_progress = True
-        
-        # Attendre que les refresh en cours se terminent
-        if self.pending_refresh:
-            # Arrêter l'ancien timer s'il existe
-            if self.operation_timer:
-                self.operation_timer.stop()
-                self.operation_timer.deleteLater()
-            
-            # Créer un timer pour attendre
-            self.operation_timer = QTimer()
-            self.operation_timer.setSingleShot(True)
-            self.operation_timer.timeout.connect(self._complete_enroll_operation)
-            self.operation_timer.start(100)  # Vérifier toutes les 100ms
-        else:
-            self._complete_enroll_operation()
-    
-    def _complete_enroll_operation(self):
-        """Finalise l'opération d'enrôlement"""
-        if self.pending_refresh:
-            # Encore en cours, re-programmer
-            if self.operation_timer:
-                self.operation_timer.stop()
-                self.operation_timer.deleteLater()
-            
-            self.operation_timer = QTimer()
-            self.operation_timer.setSingleShot(True)
-            self.operation_timer.timeout.connect(self._complete_enroll_operation)
-            self.operation_timer.start(100)
-            return
-            
         self.start_refresh_thread()
-        QTimer.singleShot(500, self._reset_operation_flag)  # Reset après 500ms
-        self.switch_to_main_view()
+        self.operation_generation = self.refresh_generation
+
+    def _complete_operation(self, generation):
+        """Appelé à l'arrivée d'un résultat (ou d'une erreur) de refresh"""
+        if self.operation_generation is not None and generation >= self.operation_generation:
+            self.operation_generation = None
+            self.operation_in_progress = False
 
     def force_totp_refresh(self):
         """Timer de backup pour forcer le refresh des TOTP toutes les secondes"""
@@ -246,107 +313,212 @@ class MainWindow(QWidget):
                         self.start_refresh_thread()
                         break
 
-    def start_refresh_thread(self):     
-        if not self.refresh_mutex.tryLock():
-            return  # Si un rafraîchissement est déjà en cours, on ne fait rien
-        try:
-            if self.pending_refresh:
-                return
-            if (hasattr(self, 'current_refresh_thread') and 
-                self.current_refresh_thread is not None and 
-                self.current_refresh_thread.isRunning()):
-                return
-            self.pending_refresh = True
-
-            """Lance le worker dans un thread séparé"""
-            self.current_refresh_thread = QThread()
-            self.worker = OTPRefreshWorker(self.backend)
-            self.worker.moveToThread(self.current_refresh_thread)
-
-            self.current_refresh_thread.started.connect(self.worker.run)
-            self.worker.finished.connect(self.on_refresh_data_ready)
-            self.worker.error.connect(self.on_refresh_error)
-            self.worker.device_status_changed.connect(self._handle_detection_result)
-            
-            # Nettoyage
-            self.worker.finished.connect(self.current_refresh_thread.quit)
-            self.worker.finished.connect(self.worker.deleteLater)
-            self.worker.finished.connect(self.reset_pending_refresh)
-            self.worker.error.connect(self.current_refresh_thread.quit)
-            self.worker.error.connect(self.worker.deleteLater)
-            self.worker.error.connect(self.reset_pending_refresh)
-            self.current_refresh_thread.finished.connect(self.current_refresh_thread.deleteLater)
-            self.current_refresh_thread.finished.connect(self.on_worker_thread_finished)
-            
-            self.current_refresh_thread.start()
-        finally:
-            self.refresh_mutex.unlock()
+    @property
+    def pending_refresh(self) -> bool:
+        """Vrai tant que la génération de refresh la plus récente n'a pas abouti"""
+        return self.refresh_generation in self.refresh_jobs
+
+    def start_refresh_thread(self, code_targets=None, priority=PRIORITY_BACKGROUND):
+        """Lance un refresh dans un thread séparé.
+        Un refresh déjà en cours est annulé et ses résultats seront ignorés.
+        Seuls les TOTP visibles sont générés ; code_targets limite le refresh
+        à ces générateurs, sans énumération."""
+        for _thread, old_worker in self.refresh_jobs.values():
+            old_worker.cancel()
+        if code_targets is None:
+            self.rollover_missed = False  # ce refresh part après le changement de période
+
+        self.refresh_generation += 1
+        generation = self.refresh_generation
+
+        thread = QThread()
+        known_codes = {label: card.code for label, card in self.generator_widgets.items()}
+        page_capacity = self.scroll_area.viewport().height() // CARD_MIN_HEIGHT + 1
+        worker = OTPRefreshWorker(self.backend, known_codes, generation,
+                                  visible_labels=self.visible_labels(),
+                                  search_text=self.search_bar.text(),
+                                  new_code_budget=page_capacity,
+                                  code_targets=code_targets,
+                                  priority=priority)
+        worker.moveToThread(thread)
+        self.refresh_jobs[generation] = (thread, worker)
+
+        thread.started.connect(worker.run)
+        worker.partial.connect(self.on_refresh_partial)
+        worker.finished.connect(self.on_refresh_data_ready)
+        worker.error.connect(self.on_refresh_error)
+
+        # Nettoyage
+        worker.done.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(self.on_worker_thread_finished)
+
+        thread.start()
 
     def on_worker_thread_finished(self):
-        """Appelé quand le worker se termine"""
-        self.current_refresh_thread = None
+        """Appelé quand un thread de refresh se termine"""
+        thread = self.sender()
+        for generation, (job_thread, _worker) in list(self.refresh_jobs.items()):
+            if job_thread is thread:
+                del self.refresh_jobs[generation]
+        if self.rollover_missed and not self.pending_refresh:
+            self.rollover_missed = False
+            self.start_refresh_thread()
 
-    def reset_pending_refresh(self):
-        """Reset le flag de refresh en cours"""
-        self.pending_refresh = False
+    def on_refresh_partial(self, generation, delta):
+        """Résultat intermédiaire du worker : métadonnées, puis chaque code à son arrivée"""
+        if generation != self.refresh_generation:
+            return  # Résultat d'un refresh dépassé par un plus récent
+        self.status_label.hide()
+        self._apply_delta(delta)
 
-    def on_refresh_data_ready(self, generators):
-        """Met à jour l'UI avec les nouvelles données"""
+    def on_refresh_data_ready(self, generation, delta):
+        """Fin du refresh : applique les derniers codes du worker"""
+        if generation != self.refresh_generation:
+            return  # Résultat d'un refresh dépassé par un plus récent
+        self._complete_operation(generation)
         self.status_label.hide()
-        
-        existing = set(self.generator_widgets.keys())
-        active = set()
-
-        for g in generators:
-            label = g.label
-            active.add(label)
-
-            if label not in self.generator_widgets:
-                card = OTPCard(
-                    label=g.label,
-                    code=g.code,
-                    parameters=g.display_parameters(),
-                    otp_type=g.otp_type,
-                    period=g.period
-                )
-                card.request_code.connect(lambda l=g.label, t=g.otp_type, p=g.period: self.update_hotp(l, t, p))
-                card.delete_requested.connect(self.confirm_delete)
-                card.parameters_requested.connect(lambda l=g.label, t=g.otp_type: self.on_parameters_requested(l, t))
+        self._apply_delta(delta)
+        # Les cartes ajoutées hors budget ou dévoilées entre-temps
+        self.schedule_visibility_check()
+
+    def _apply_delta(self, delta):
+        """Seules les cartes concernées par le delta sont touchées"""
+        if delta.is_empty():
+            return
+
+        # Un seul relayout/repaint pour tout le lot
+        self.otp_list_widget.setUpdatesEnabled(False)
+        try:
+            # Supprimer d'abord les cartes qui n'existent plus : elles servent aux ajouts
+            for old_label in delta.removed:
+                card = self.generator_widgets.pop(old_label, None)
+                if card is None:
+                    continue
+                if old_label in self.last_totp_cycles:
+                    del self.last_totp_cycles[old_label]
+                self.code_cycles.pop(old_label, None)
+                self._release_card(card)
+
+            for g, code in delta.added:
+                label = g.label
+                if label in self.generator_widgets:
+                    continue
+                card = self._acquire_card(g, code)
                 self.otp_list_layout.addWidget(card)
+                card.setVisible(self.search_bar.text().lower() in label.lower())
                 self.generator_widgets[label] = card
 
                 if g.otp_type == 2:
                     self.last_totp_cycles[label] = int(time.time() // g.period)
-            else:
-                # Mettre à jour le code seulement pour TOTP
-                if g.otp_type == 2:  # TOTP
-                    self.generator_widgets[label].set_code(g.code)
-                # Pour HOTP, ne pas mettre à jour automatiquement
-
-        # Supprimer les cartes qui n'existent plus
-        for old_label in existing - active:
-            card = self.generator_widgets.pop(old_label)
-            if old_label in self.last_totp_cycles:
-                del self.last_totp_cycles[old_label]
-            card.setParent(None)
-            card.deleteLater()
+                    if code != CODE_PLACEHOLDER:
+                        self.code_cycles[label] = delta.windows.get(label, self.last_totp_cycles[label])
+
+            for label, code in delta.changed.items():
+                card = self.generator_widgets.get(label)
+                if card is not None:
+                    card.set_code(code)
+                    # Fenêtre du code, pas celle de son arrivée : un lot à cheval sur deux
+                    # périodes ne fait pas passer ses codes expirés pour frais
+                    self.code_cycles[label] = delta.windows.get(label, int(time.time() // card.period))
+        finally:
+            self.otp_list_widget.setUpdatesEnabled(True)
+        if delta.added or delta.removed:
+            self.generators_changed.emit()
 
-    def on_refresh_error(self, message):
+    def on_refresh_error(self, generation, message):
         """Gère les erreurs de refresh"""
+        if generation != self.refresh_generation:
+            return
+        self._complete_operation(generation)
         self.status_label.setText(f"{message}")
         self.status_label.show()
         self.set_cards_offline(_("Device disconnected"))
 
+    def _acquire_card(self, generator, code):
+        """Carte du pool réassociée à generator, ou nouvelle carte si le pool est vide.
+        Les signaux sont connectés une seule fois, à la création : ils portent le label
+        courant de la carte, jamais celui du générateur d'origine."""
+        if self.card_pool:
+            card = self.card_pool.pop()
+            card.bind(generator, code)
+            return card
+        card = OTPCard(generator=generator, code=code)
+        card.request_code.connect(self.on_hotp_requested)
+        card.delete_requested.connect(self.confirm_delete)
+        card.parameters_requested.connect(self.on_parameters_requested)
+        card.copy_requested.connect(self.on_copy_requested)
+        return card
+
+    def _release_card(self, card):
+        """Retire une carte de la liste et la garde pour un prochain générateur"""
+        self.otp_list_layout.removeWidget(card)
+        card.hide()
+        if len(self.card_pool) >= CARD_POOL_SIZE:
+            # Détacher avant de détruire (sinon elle reste vivante comme fenêtre cachée)
+            card.setParent(None)
+            card.deleteLater()
+            return
+        # Restes d'une animation de suppression
+        for animation in card.findChildren(QPropertyAnimation, options=Qt.FindChildOption.FindDirectChildrenOnly):
+            animation.deleteLater()
+        card.setGraphicsEffect(None)
+        card.setMaximumHeight(QWIDGETSIZE_MAX)
+        card.setEnabled(True)
+        self.card_pool.append(card)
+
     def clear_all_cards(self):
         """Vide toutes les cartes OTP"""
         for card in self.generator_widgets.values():
-            card.setParent(None)
-            card.deleteLater()
+            self._release_card(card)
         self.generator_widgets.clear()
 
+    def on_hotp_requested(self, label):
+        card = self.generator_widgets.get(label)
+        if card is not None:
+            self.update_hotp(label, card.otp_type, card.period)
+
+    def on_copy_requested(self, label):
+        """Copie le code TOTP de la fenêtre courante, pas celui affiché"""
+        card = self.generator_widgets.get(label)
+        if card is None:
+            return
+        backend = self.backend
+        period = card.period
+        # Fenêtre déjà en cache : copie immédiate, sans passer par le pool de threads
+        code = backend.cached_code(label, period)
+        if code:
+            self._on_copy_code_ready((label, code))
+            return
+        run_device_task(lambda: (label, backend.generate_code(label, 2, period, priority=PRIORITY_INTERACTIVE)),
+                        on_finished=self._on_copy_code_ready, on_failed=self._on_copy_failed, context=label)
+
+    def _on_copy_code_ready(self, result):
+        label, code = result
+        card = self.generator_widgets.get(label)
+        if card is None or not code:
+            return
+        card.set_code(code)
+        self.code_cycles[label] = int(time.time() // card.period)
+        card.copy_to_clipboard(code)
+
+    def _on_copy_failed(self, label, error):
+        # Rien n'est copié, comme pour un code vide : le code affiché reste en place
+        self._on_copy_code_ready((label, None))
+
     def update_hotp(self, label, otp_type, period):
-        # Pour HOTP, on fait un appel direct et rapide
-        code = self.backend.generate_code(label, otp_type, period)
+        # Appel device hors du thread GUI : un token qui ne répond pas ne gèle pas la fenêtre
+        backend = self.backend
+        run_device_task(lambda: (label, backend.generate_code(label, otp_type, period)),
+                        on_finished=self._on_hotp_ready, on_failed=self._on_hotp_failed, context=label)
+
+    def _on_hotp_failed(self, label, error):
+        if label in self.generator_widgets:
+            self.generator_widgets[label].set_code(error)
+
+    def _on_hotp_ready(self, result):
+        label, code = result
         if code is None:
             code = f"{getattr(self.backend, 'last_error', 'Unknown')}"
         elif code is False:
@@ -362,29 +534,34 @@ class MainWindow(QWidget):
             return
 
         if otp_type == 1:  # HOTP : rafraîchir les paramètres depuis le device
-            try:
-                all_generators = self.backend.get_all_generators()
-                
-                if all_generators:  # Liste non vide
-                    # Chercher le générateur spécifique
-                    found_generator = next((g for g in all_generators if g.get(1) == label), None)
-                    if found_generator:
-                        from core.otp_model import OTPGenerator
-                        card.parameter_text = OTPGenerator(found_generator).display_parameters()
-                
-            except Exception as e:
-                # print(f"Erreur lors du rafraîchissement des paramètres HOTP pour {label}: {e}")
-                pass
+            backend = self.backend
+            run_device_task(lambda: (label, backend.get_all_generators()),
+                            on_finished=self._on_hotp_parameters_ready,
+                            on_failed=self._on_hotp_parameters_failed, context=label)
+            return
 
         card.show_parameters()
 
+    def _on_hotp_parameters_failed(self, label, error):
+        # Paramètres non relus : affiche ceux de la dernière énumération
+        self._on_hotp_parameters_ready((label, None))
+
+    def _on_hotp_parameters_ready(self, result):
+        label, all_generators = result
+        card = self.generator_widgets.get(label)
+        if not card:
+            return
+        if all_generators:  # Liste non vide
+            # Chercher le générateur spécifique
+            found_generator = next((g for g in all_generators if g.get(1) == label), None)
+            if found_generator:
+                card.generator = OTPGenerator(found_generator)
+        card.show_parameters()
+
     def confirm_delete(self, label):
         """Confirmation et suppression d'un générateur"""
-        if ":" in label:
-            account, issuer = label.split(":", 1)
-        else:
-            account = label
-            issuer = ""
+        card = self.generator_widgets.get(label)
+        account = card.generator.account if card else label
         
         # Créer une boîte de dialogue avec boutons personnalisés
         msg = QMessageBox(self)
@@ -404,94 +581,84 @@ class MainWindow(QWidget):
         clicked_button = msg.clickedButton()
         
         if clicked_button == yes_button:
-            self.operation_in_progress = True
-            self.pending_delete_label = label
-            
-            # Attendre que les refresh en cours se terminent
-            if self.pending_refresh:
-                # Arrêter l'ancien timer s'il existe
-                if self.operation_timer:
-                    self.operation_timer.stop()
-                    self.operation_timer.deleteLater()
-                
-                # Créer un timer pour attendre
-                self.operation_timer = QTimer()
-                self.operation_timer.setSingleShot(True)
-                self.operation_timer.timeout.connect(self._complete_delete_operation)
-                self.operation_timer.start(100)
-            else:
-                self._complete_delete_operation()
+            self._complete_delete_operation(label)
 
-    def _complete_delete_operation(self):
-        """Finalise l'opération de suppression"""
-        if self.pending_refresh:
-            # Encore en cours, re-programmer
-            if self.operation_timer:
-                self.operation_timer.stop()
-                self.operation_timer.deleteLater()
-            
-            self.operation_timer = QTimer()
-            self.operation_timer.setSingleShot(True)
-            self.operation_timer.timeout.connect(self._complete_delete_operation)
-            self.operation_timer.start(100)
-            return
-            
-        label = self.pending_delete_label
-        success = self.backend.delete_generator(label)
+    def _complete_delete_operation(self, label):
+        """Supprime le générateur : la commande est prioritaire sur un refresh en cours"""
+        self.operation_in_progress = True
+        backend = self.backend
+        run_device_task(lambda: (label, backend.delete_generator(label)),
+                        on_finished=self._on_delete_finished, on_failed=self._on_delete_failed, context=label)
+
+    def _on_delete_failed(self, label, error):
+        QMessageBox.warning(self, _("Error"), error or _("Deletion of '{label}' failed").format(label=label))
+        self.operation_in_progress = False
 
+    def _on_delete_finished(self, result):
+        label, success = result
         if success:
             # Retire la card visuellement instantanément
-            if label in self.generator_widgets:
-                card = self.generator_widgets.pop(label)
-            card.setEnabled(False)
-            # Animation d'opacité
-            self.opacity_effect = QGraphicsOpacityEffect()
-            card.setGraphicsEffect(self.opacity_effect)
-            self.opacity_animation = QPropertyAnimation(self.opacity_effect, b"opacity")
-            self.opacity_animation.setDuration(250)  # 250ms
-            self.opacity_animation.setStartValue(1.0)
-            self.opacity_animation.setEndValue(0.0)
-            self.opacity_animation.setEasingCurve(QEasingCurve.Type.OutQuad)
-            # Animation de hauteur
-            self.height_animation = QPropertyAnimation(card, b"maximumHeight")
-            self.height_animation.setDuration(250)
-            self.height_animation.setStartValue(card.height())
-            self.height_animation.setEndValue(0)
-            self.height_animation.setEasingCurve(QEasingCurve.Type.OutQuad)
-            self.height_animation.finished.connect(lambda: card.setParent(None))      
-            # Démarrer les animations
-            self.opacity_animation.start()
-            self.height_animation.start()
+            card = self.generator_widgets.pop(label, None)
+            if card is not None:
+                card.setEnabled(False)
+                # Animations rattachées à la carte : une suppression suivante ne peut
+                # plus les détruire avant leur fin (carte fantôme jamais libérée)
+                # Animation d'opacité
+                opacity_effect = QGraphicsOpacityEffect(card)
+                card.setGraphicsEffect(opacity_effect)
+                opacity_animation = QPropertyAnimation(opacity_effect, b"opacity", card)
+                opacity_animation.setDuration(250)  # 250ms
+                opacity_animation.setStartValue(1.0)
+                opacity_animation.setEndValue(0.0)
+                opacity_animation.setEasingCurve(QEasingCurve.Type.OutQuad)
+                # Animation de hauteur
+                height_animation = QPropertyAnimation(card, b"maximumHeight", card)
+                height_animation.setDuration(250)
+                height_animation.setStartValue(card.height())
+                height_animation.setEndValue(0)
+                height_animation.setEasingCurve(QEasingCurve.Type.OutQuad)
+                height_animation.finished.connect(lambda: self._release_card(card))
+                # Démarrer les animations
+                opacity_animation.start()
+                height_animation.start()
 
             #card.setParent(None)
             # Nettoyer le tracking du cycle supprimé
             if label in self.last_totp_cycles:
                 del self.last_totp_cycles[label]
+            self.code_cycles.pop(label, None)
             # Refresh listing affichage
-            self.start_refresh_thread()
-            QTimer.singleShot(500, self._reset_operation_flag)  # Reset après 500ms
+            self._start_operation_refresh()
         else:
             error_msg = getattr(self.backend, "last_error", _("Deletion of '{label}' failed").format(label=label))
             QMessageBox.warning(self, _("Error"), error_msg)
-            self._reset_operation_flag()
+            self.operation_in_progress = False
+
+    def hideEvent(self, event):
+        """Fenêtre cachée (zone de notification, réduite) : plus d'animation ni de refresh
+        périodique ; le détecteur garde la session device ouverte"""
+        self.pause_timers()
+        super().hideEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.progress_timer.isActive():
+            self.progress_timer.start(PROGRESS_TICK_MS)
+            self.backup_refresh_timer.start(1000)
+            if not self.pending_refresh:
+                self.start_refresh_thread()  # rattrape les cycles TOTP manqués
+
+    def pause_timers(self):
+        self.progress_timer.stop()
+        self.backup_refresh_timer.stop()
 
-    def _reset_operation_flag(self):
-        """Reset le flag d'opération en cours"""
-        self.operation_in_progress = False
-        
-        # Nettoyer le timer d'opération s'il existe
-        if self.operation_timer:
-            self.operation_timer.stop()
-            self.operation_timer.deleteLater()
-            self.operation_timer = None
-        
     def closeEvent(self, event):
         """Nettoyage à la fermeture"""
-        # Arrêter les timers
-        if self.operation_timer:
-            self.operation_timer.stop()
-            self.operation_timer.deleteLater()
-            
+        if self.tray_mode:
+            # Mode résident : on garde la connexion et les générateurs chargés
+            event.ignore()
+            self.hide()
+            return
         # Arrêt du thread de détection
         try:
             if getattr(self, "detector", None):
@@ -512,24 +679,37 @@ class MainWindow(QWidget):
         except Exception:
             pass
 
-        # Arrêt du thread de rafraîchissement si présent
-        try:
-            if (hasattr(self, 'current_refresh_thread') and 
-                self.current_refresh_thread is not None and 
-                self.current_refresh_thread.isRunning()):
+        # Arrêt de la surveillance des lecteurs PC/SC
+        if getattr(self, "pcsc_thread", None):
+            self.pcsc_monitor.stop()
+            self.pcsc_thread.quit()
+            self.pcsc_thread.wait(3000)
+            self.pcsc_thread = None
 
-                self.current_refresh_thread.quit()
-                self.current_refresh_thread.wait(3000)  # Timeout 3 secondes
+        # Arrêt des threads de rafraîchissement en cours
+        try:
+            for thread, worker in list(self.refresh_jobs.values()):
+                worker.cancel()
+                if thread.isRunning():
+                    thread.quit()
+                    thread.wait(3000)  # Timeout 3 secondes
         except Exception:
             pass
 
+        # Arrêt du worker device en mode processus séparé
+        close_backend = getattr(self.backend, "close", None)
+        if close_backend:
+            close_backend()
+
         super().closeEvent(event)
 
 class IconButton(QPushButton):
+    _icons = {}  # chemin -> QIcon
+
     def __init__(self, normal_icon, hover_icon, size=QSize(30, 30), parent=None):
         super().__init__(parent)
-        self.normal_icon = QIcon(str(normal_icon))
-        self.hover_icon = QIcon(str(hover_icon))
+        self.normal_icon = self.icon_for(normal_icon)
+        self.hover_icon = self.icon_for(hover_icon)
         self.setIcon(self.normal_icon)
         self.setIconSize(size)
         self.setFixedSize(size)
@@ -539,6 +719,14 @@ class IconButton(QPushButton):
         self.pressed.connect(self.on_pressed)
         self.released.connect(self.on_released)
 
+    @classmethod
+    def icon_for(cls, path) -> QIcon:
+        """Icônes partagées entre boutons : chaque image n'est lue qu'une fois"""
+        icon = cls._icons.get(str(path))
+        if icon is None:
+            icon = cls._icons[str(path)] = QIcon(str(path))
+        return icon
+
     def enterEvent(self, event):
         if not self.is_pressed:
             self.setIcon(self.hover_icon)
@@ -12,21 +12,21 @@ from ui.ressources import resource_path
 class OTPCard(QFrame):
     request_code = pyqtSignal(str)  # signal avec le label
     delete_requested = pyqtSignal(str)
+    copy_requested = pyqtSignal(str)  # TOTP : le code de la fenêtre courante est demandé au backend
     parameters_requested = pyqtSignal(str, int)  # label, otp_type
 
-    def __init__(self, label: str, code: str, parameters: str, otp_type: int, period: int, parent=None):
+    def __init__(self, generator, code: str, parent=None):
         super().__init__(parent)
-        if ":" in label:
-            self.account, self.issuer = label.split(":", 1)
-        else:
-            self.account = label
-            self.issuer = ""
-        self.label_text = label
-        self.otp_type = otp_type
-        self.period = period
+        self.generator = None  # OTPGenerator immuable, partagé avec le worker (cf. bind)
+        self.account = generator.account
+        self.issuer = generator.issuer
+        self.label_text = generator.label
+        self.otp_type = generator.otp_type
+        self.period = generator.period
         self.remaining_seconds = 0
-        self.parameter_text = parameters
-        self.code = code
+        self.code = None
+        self.btn = None       # bouton HOTP, créé au premier générateur HOTP
+        self.progress = None  # barre TOTP, créée au premier générateur TOTP
 
         self.setObjectName("otpCard")
         
@@ -92,17 +92,7 @@ class OTPCard(QFrame):
         top_layout.setContentsMargins(0, 0, 0, 0)
         top_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
-        if otp_type == 1:  # HOTP
-            refresh_icon_path = resource_path("images/refresh.png")
-            refresh_icon_clicked_path = resource_path("images/refresh_clicked.png")
-            self.btn = IconButton(refresh_icon_path, refresh_icon_clicked_path, QSize(35, 35))
-            self.btn.setFlat(True)
-            self.btn.setObjectName("RefreshBtn")
-            self.btn.clicked.connect(lambda: self.request_code.emit(self.label_text))
-            top_layout.addWidget(self.btn)
-        else:  # TOTP
-            self.progress = ProgressIndicator(period)
-            top_layout.addWidget(self.progress)
+        self.top_layout = top_layout
 
         # Forcer une hauteur identique du bloc (pour uniformiser TOTP/HOTP)
         top_container.setFixedHeight(38)
@@ -116,7 +106,7 @@ class OTPCard(QFrame):
         self.info_button.setFixedSize(15, 15)
         self.info_button.setFlat(True)
         self.info_button.setToolTip(_("Show OTP parameters"))
-        self.info_button.clicked.connect(lambda: self.parameters_requested.emit(self.label_text, self.otp_type))
+        self.info_button.clicked.connect(self.emit_parameters_requested)
 
         delete_button_path = resource_path("images/trash.png")
         delete_button_clicked_path = resource_path("images/trash_clicked.png")
@@ -124,7 +114,7 @@ class OTPCard(QFrame):
         self.delete_button.setFixedSize(15, 15)
         self.delete_button.setFlat(True)
         self.delete_button.setToolTip(_("Delete OTP account"))
-        self.delete_button.clicked.connect(lambda: self.delete_requested.emit(self.label_text))
+        self.delete_button.clicked.connect(self.emit_delete_requested)
 
         # Ligne du bas pour info/delete
         bottom_buttons = QHBoxLayout()
@@ -139,8 +129,55 @@ class OTPCard(QFrame):
         main_layout.addLayout(right_layout)
         main_layout.setAlignment(right_layout, Qt.AlignmentFlag.AlignVCenter)
 
+        self.bind(generator, code)
+
+    def bind(self, generator, code: str):
+        """(Ré)associe la carte à un générateur : une carte recyclée garde ses widgets
+        et ses connexions, qui lisent toujours label_text/otp_type au moment de l'émission"""
+        self.generator = generator
+        self.account = generator.account
+        self.issuer = generator.issuer
+        self.label_text = generator.label
+        self.otp_type = generator.otp_type
+        self.period = generator.period
+        self.remaining_seconds = 0
+        self.account_label.setText(self.account)
+        self.issuer_label.setText(self.issuer)
+        self.feedback_label.setVisible(False)
 
-        self.set_code(self.code)
+        if self.otp_type == 1:  # HOTP
+            if self.btn is None:
+                from ui.main_window import IconButton
+                refresh_icon_path = resource_path("images/refresh.png")
+                refresh_icon_clicked_path = resource_path("images/refresh_clicked.png")
+                self.btn = IconButton(refresh_icon_path, refresh_icon_clicked_path, QSize(35, 35))
+                self.btn.setFlat(True)
+                self.btn.setObjectName("RefreshBtn")
+                self.btn.clicked.connect(self.emit_request_code)
+                self.top_layout.addWidget(self.btn)
+        else:  # TOTP
+            if self.progress is None:
+                self.progress = ProgressIndicator(self.period)
+                self.top_layout.addWidget(self.progress)
+            self.progress.period = self.period
+        if self.btn is not None:
+            self.btn.setVisible(self.otp_type == 1)
+        if self.progress is not None:
+            self.progress.setVisible(self.otp_type == 2)
+
+        if self.property("offline"):
+            self.set_online()
+        self.code = None
+        self.set_code(code)
+
+    def emit_request_code(self):
+        self.request_code.emit(self.label_text)
+
+    def emit_delete_requested(self):
+        self.delete_requested.emit(self.label_text)
+
+    def emit_parameters_requested(self):
+        self.parameters_requested.emit(self.label_text, self.otp_type)
 
     # --- méthodes utilitaires ---
     def format_code(self, code):
@@ -155,13 +192,22 @@ class OTPCard(QFrame):
             return code
 
     def copy_code(self):
-        code_with_spaces = self.label_code.text()
-        code_without_spaces = code_with_spaces.replace(" ", "")
+        if self.otp_type == 2:
+            # Le code affiché peut dater d'une fenêtre passée (carte restée hors écran)
+            self.copy_requested.emit(self.label_text)
+            return
+        self.copy_to_clipboard(self.label_code.text())
+
+    def copy_to_clipboard(self, code: str):
+        code_without_spaces = code.replace(" ", "")
         QApplication.clipboard().setText(code_without_spaces)
         self.feedback_label.setVisible(True)
         QTimer.singleShot(1000, lambda: self.feedback_label.setVisible(False))
 
     def set_code(self, code: str):
+        if code == self.code:
+            return  # Rien à redessiner
+        self.code = code
         if "•" in code:
             self.label_code.setText(code)
             self.copy_button.setVisible(False)
@@ -182,11 +228,11 @@ class OTPCard(QFrame):
         
         menu = QMenu(self)
         show_params_action = QAction(_("Show OTP parameters"), self)
-        show_params_action.triggered.connect(lambda: self.parameters_requested.emit(self.label_text, self.otp_type))
+        show_params_action.triggered.connect(self.emit_parameters_requested)
 
         delete_action = QAction(_("Delete OTP code"), self)
         delete_action.setObjectName("deleteAction")
-        delete_action.triggered.connect(lambda: self.delete_requested.emit(self.label_text))
+        delete_action.triggered.connect(self.emit_delete_requested)
 
         menu.addAction(show_params_action)
         menu.addSeparator()
@@ -197,12 +243,13 @@ class OTPCard(QFrame):
         msg = QMessageBox(self)
         msg.setWindowTitle(_("Informations"))
         msg.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        msg.setText(self.parameter_text)
+        msg.setText(self.generator.display_parameters())
         msg.setStandardButtons(QMessageBox.StandardButton.Ok)
         msg.exec()
 
     def set_offline(self, reason: str = _("Disconnected")):
-        self.label_code.setText("• • • • • •")
+        self.code = "• • • • • •"  # le prochain refresh réaffichera le vrai code
+        self.label_code.setText(self.code)
         self.copy_button.setVisible(False)
         self.info_button.setVisible(False)
         self.delete_button.setVisible(False)
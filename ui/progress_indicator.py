@@ -1,47 +1,83 @@
 # ui/progress_indicator.py
+# Barre de temps restant d'un TOTP. L'horloge commune de MainWindow appelle
+# update_progress_value ; la barre ne se redessine que si son remplissage a
+# changé d'au moins un pixel physique. Pinceaux et fond sont partagés.
 from PyQt6.QtWidgets import QWidget, QSizePolicy
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPainter, QColor, QBrush
+from PyQt6.QtGui import QPainter, QColor, QBrush, QPixmap
+
+BACKGROUND_COLOR = "#c3e9fc"
+FILL_COLOR = "#52c5e4"
+MAX_CACHED_BACKGROUNDS = 16
+
 
 class ProgressIndicator(QWidget):
+    _brushes = None       # (fond, remplissage), créés au premier dessin
+    _backgrounds = {}     # (largeur, hauteur, ratio de pixels) -> QPixmap du fond arrondi
+
     def __init__(self, period=30, parent=None):
         super().__init__(parent)
         self.period = period
         self.remaining_seconds = 0
+        self.fill_pixels = -1  # largeur remplie (pixels physiques) du dernier dessin demandé
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         self.setFixedHeight(12)
         self.setMaximumWidth(300)
         self.setMinimumWidth(100)
-        
+
+    def fill_ratio(self) -> float:
+        return self.remaining_seconds / self.period
+
     def update_progress_value(self, current_time):
-        """Met à jour la valeur de progression basée sur le temps actuel"""
+        """Met à jour la valeur de progression basée sur le temps actuel ;
+        ne déclenche un repaint que si le remplissage change à l'écran"""
         cycle_position = current_time % self.period
         self.remaining_seconds = self.period - cycle_position
-        self.update()  # Déclenche un repaint
-        
+        fill_pixels = int(self.width() * self.devicePixelRatioF() * self.fill_ratio())
+        if fill_pixels != self.fill_pixels:
+            self.fill_pixels = fill_pixels
+            # Hors écran (défilement, recherche) : rien à dessiner, l'exposition repeindra
+            if not self.visibleRegion().isEmpty():
+                self.update()
+
+    @classmethod
+    def _background(cls, w, h, ratio) -> QPixmap:
+        key = (w, h, ratio)
+        pixmap = cls._backgrounds.get(key)
+        if pixmap is None:
+            if len(cls._backgrounds) >= MAX_CACHED_BACKGROUNDS:
+                cls._backgrounds.clear()  # tailles d'avant un redimensionnement de la fenêtre
+            pixmap = QPixmap(round(w * ratio), round(h * ratio))
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setBrush(cls._brushes[0])
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.drawRoundedRect(0, 0, w, h, h / 2, h / 2)
+            painter.end()
+            cls._backgrounds[key] = pixmap
+        return pixmap
+
     def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if ProgressIndicator._brushes is None:
+            ProgressIndicator._brushes = (QBrush(QColor(BACKGROUND_COLOR)), QBrush(QColor(FILL_COLOR)))
 
         # Dimensions
         w = self.width()
         h = self.height()
         r = h / 2
 
-        # Bord arrondi
-        bg_brush = QBrush(QColor("#c3e9fc"))
-        fill_brush = QBrush(QColor("#52c5e4"))
-
-        # Arrière-plan
-        painter.setBrush(bg_brush)
-        painter.setPen(Qt.PenStyle.NoPen)
-        painter.drawRoundedRect(0, 0, w, h, r, r)
+        painter = QPainter(self)
+        # Arrière-plan : pixmap partagée par toutes les barres de même taille
+        painter.drawPixmap(0, 0, self._background(w, h, self.devicePixelRatioF()))
 
         # Remplissage progressif
-        fill_ratio = self.remaining_seconds / self.period
-        fill_width = int(w * fill_ratio)
-        painter.setBrush(fill_brush)
-        painter.drawRoundedRect(0, 0, int(fill_width), h, r, r)
-
+        fill_width = int(w * self.fill_ratio())
+        if fill_width > 0:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setBrush(self._brushes[1])
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.drawRoundedRect(0, 0, fill_width, h, r, r)
 
         painter.end()
@@ -0,0 +1,217 @@
+# ui/tray.py
+# Mode résident (--tray) : la fenêtre se cache dans la zone de notification au lieu
+# de quitter ; le backend reste connecté et la liste des générateurs reste chargée.
+# La palette de copie rapide s'ouvre par l'icône, Ctrl+K, ou depuis un raccourci
+# clavier global du bureau lançant `main.py --palette`, qui réveille l'instance
+# résidente par un socket local et se termine aussitôt.
+
+import getpass
+
+from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLineEdit, QListWidget,
+                             QListWidgetItem, QLabel, QSystemTrayIcon, QMenu)
+from PyQt6.QtCore import Qt, QObject, QTimer
+from PyQt6.QtGui import QShortcut, QKeySequence, QGuiApplication
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+from core.device_task import run_device_task
+from core.fido_backend import PRIORITY_INTERACTIVE
+
+
+def palette_server_name() -> str:
+    return f"NeoOTP-palette-{getpass.getuser()}"
+
+
+def summon_resident_palette(timeout_ms=300) -> bool:
+    """Demande à l'instance résidente d'ouvrir sa palette ; False si aucune ne répond"""
+    socket = QLocalSocket()
+    socket.connectToServer(palette_server_name())
+    if not socket.waitForConnected(timeout_ms):
+        return False
+    socket.write(b"palette\n")
+    socket.waitForBytesWritten(timeout_ms)
+    socket.disconnectFromServer()
+    return True
+
+
+class QuickPalette(QWidget):
+    """Liste filtrable des générateurs : Entrée copie un code frais dans le presse-papiers"""
+
+    def __init__(self, backend, parent=None):
+        super().__init__(parent, Qt.WindowType.Tool | Qt.WindowType.FramelessWindowHint
+                         | Qt.WindowType.WindowStaysOnTopHint)
+        self.setObjectName("quickPalette")
+        self.backend = backend
+        self.generators = {}  # label -> OTPGenerator
+        self.pending_label = None
+        self.setMinimumWidth(360)
+
+        layout = QVBoxLayout(self)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText(_("Search for a code..."))
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        self.filter_edit.returnPressed.connect(self.copy_selected)
+        layout.addWidget(self.filter_edit)
+
+        self.list_widget = QListWidget()
+        self.list_widget.itemActivated.connect(lambda item: self.copy_selected())
+        layout.addWidget(self.list_widget)
+
+        self.status = QLabel()
+        self.status.setObjectName("paletteStatus")
+        layout.addWidget(self.status)
+
+    def set_generators(self, generators):
+        """Recharge la liste en gardant le filtre courant"""
+        self.generators = {g.label: g for g in generators}
+        self.list_widget.clear()
+        for label in sorted(self.generators, key=str.lower):
+            self.list_widget.addItem(QListWidgetItem(label))
+        self.apply_filter(self.filter_edit.text())
+
+    def open_palette(self, generators):
+        self.filter_edit.clear()
+        self.status.clear()
+        self.set_generators(generators)
+        screen = QGuiApplication.primaryScreen()
+        if screen is not None:
+            area = screen.availableGeometry()
+            self.adjustSize()
+            self.move(area.center().x() - self.width() // 2, area.top() + area.height() // 4)
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.filter_edit.setFocus()
+
+    def apply_filter(self, text):
+        text = text.lower()
+        first_visible = None
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            hidden = text not in item.text().lower()
+            item.setHidden(hidden)
+            if not hidden and first_visible is None:
+                first_visible = item
+        self.list_widget.setCurrentItem(first_visible)
+
+    def copy_selected(self):
+        item = self.list_widget.currentItem()
+        if item is None or item.isHidden() or self.pending_label:
+            return
+        generator = self.generators.get(item.text())
+        if generator is None:
+            return
+        self.pending_label = generator.label
+        self.status.setText(_("Generating..."))
+        # Code TOTP du cache du backend si encore valide, sinon une seule commande device
+        run_device_task(self.backend.generate_code, generator.label, generator.otp_type,
+                        generator.period, priority=PRIORITY_INTERACTIVE,
+                        on_finished=self._on_code_ready, on_failed=self._on_code_failed)
+
+    def _on_code_failed(self, _context, error):
+        self.pending_label = None
+        self.status.setText(error)
+
+    def _on_code_ready(self, code):
+        label, self.pending_label = self.pending_label, None
+        if not code:
+            error = getattr(self.backend, "last_error", None) or _("Device not detected")
+            self.status.setText(error)
+            return
+        QApplication.clipboard().setText(code)
+        self.status.setText(_("'{label}' copied").format(label=label))
+        QTimer.singleShot(300, self.hide)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_Escape:
+            self.hide()
+        elif event.key() in (Qt.Key.Key_Down, Qt.Key.Key_Up):
+            self.list_widget.setFocus()
+            self.list_widget.keyPressEvent(event)
+        else:
+            super().keyPressEvent(event)
+
+
+class TrayController(QObject):
+    """Icône de notification, palette et serveur local de l'instance résidente"""
+
+    def __init__(self, window, app):
+        super().__init__(window)
+        self.window = window
+        self.app = app
+        window.tray_mode = True
+        app.setQuitOnLastWindowClosed(False)
+        if not window.isVisible():
+            window.pause_timers()  # démarrage caché : rien à animer
+
+        self.palette = QuickPalette(window.backend)
+        window.generators_changed.connect(self.on_generators_changed)
+        QShortcut(QKeySequence("Ctrl+K"), window, activated=self.show_palette)
+
+        menu = QMenu()
+        menu.addAction(_("Quick copy"), self.show_palette)
+        menu.addAction(_("Show"), self.show_window)
+        menu.addSeparator()
+        menu.addAction(_("Quit"), self.quit)
+        self.menu = menu
+        self.tray_icon = QSystemTrayIcon(window.windowIcon(), self)
+        self.tray_icon.setToolTip("NEOWAVE OTP Manager")
+        self.tray_icon.setContextMenu(menu)
+        self.tray_icon.activated.connect(self.on_tray_activated)
+        self.tray_icon.show()
+
+        # Réveil par `main.py --palette` (raccourci clavier global du bureau)
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        QLocalServer.removeServer(palette_server_name())  # socket orphelin d'un crash
+        self.server.newConnection.connect(self.on_new_connection)
+        self.server.listen(palette_server_name())
+
+    def generators(self):
+        return [card.generator for card in self.window.generator_widgets.values()]
+
+    def show_palette(self):
+        self.palette.open_palette(self.generators())
+
+    def show_window(self):
+        self.window.showNormal()
+        self.window.raise_()
+        self.window.activateWindow()
+
+    def on_generators_changed(self):
+        if self.palette.isVisible():
+            self.palette.set_generators(self.generators())
+
+    def on_tray_activated(self, reason):
+        if reason == QSystemTrayIcon.ActivationReason.Trigger:
+            if self.window.isVisible():
+                self.window.hide()
+            else:
+                self.show_window()
+        elif reason == QSystemTrayIcon.ActivationReason.MiddleClick:
+            self.show_palette()
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.readyRead.connect(self.on_command)
+            connection.disconnected.connect(connection.deleteLater)
+            if connection.bytesAvailable():
+                self._read_commands(connection)
+
+    def on_command(self):
+        self._read_commands(self.sender())
+
+    def _read_commands(self, connection):
+        for line in bytes(connection.readAll()).splitlines():
+            if line.strip() == b"palette":
+                self.show_palette()
+            elif line.strip() == b"show":
+                self.show_window()
+
+    def quit(self):
+        self.server.close()
+        self.tray_icon.hide()
+        self.palette.close()
+        self.window.tray_mode = False
+        self.window.close()
+        self.app.quit()